@@ -7,18 +7,30 @@ require_once 'Saml2/Vendor/autoload.php';
 require_once 'config.inc';
 require_once 'auth.inc';
 
-# Include SAML2 package libraries
-require_once 'Saml2/Core/Config.inc';
-require_once 'Saml2/Core/Auth.inc';
-require_once 'Saml2/Core/Update.inc';
-require_once 'Saml2/Core/TestCase.inc';
-require_once 'Saml2/Core/TestCaseRetry.inc';
-require_once 'Saml2/Errors/ConfigError.inc';
-require_once 'Saml2/Errors/SystemError.inc';
-require_once 'Saml2/Errors/UpdateError.inc';
-require_once 'Saml2/Errors/ValidationError.inc';
+# Lazily load SAML2 package classes when they are first used. Classes are resolved using the prebuilt class map, then
+# by their PSR-4 style path (e.g. Saml2\Core\Config => Saml2/Core/Config.inc). Test cases and benchmarks are never
+# autoloaded, they are only loaded by the `pfsense-saml2 runtests` and `pfsense-saml2 benchmark` commands. The
+# Saml2\Core\Update functions cannot be autoloaded and must be included explicitly where they are used.
+spl_autoload_register(function (string $class): void {
+    static $classmap = null;
+    $classmap ??= require __DIR__ . '/classmap.php';
 
-# Include all tests
-foreach (glob('/usr/local/pkg/Saml2/Tests/*.inc') as $filename) {
-    require_once $filename;
-}
+    # Use the class map for known classes
+    if (isset($classmap[$class])) {
+        require_once __DIR__ . '/' . $classmap[$class];
+        return;
+    }
+
+    # Otherwise, fall back to the PSR-4 style path for other classes in the Saml2 namespace
+    if (
+        !str_starts_with($class, 'Saml2\\') or
+        str_starts_with($class, 'Saml2\\Tests\\') or
+        str_starts_with($class, 'Saml2\\Benchmarks\\')
+    ) {
+        return;
+    }
+    $path = __DIR__ . '/' . str_replace('\\', '/', substr($class, strlen('Saml2\\'))) . '.inc';
+    if (is_file($path)) {
+        require_once $path;
+    }
+});
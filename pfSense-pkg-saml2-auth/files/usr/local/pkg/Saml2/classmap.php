@@ -0,0 +1,28 @@
+<?php
+
+# The prebuilt class map used by Saml2/autoload.php. This maps each class in the Saml2 namespace to its file relative
+# to the Saml2 directory. Test cases and benchmarks are intentionally excluded.
+return [
+    'Saml2\Core\Auth' => 'Core/Auth.inc',
+    'Saml2\Core\Benchmark' => 'Core/Benchmark.inc',
+    'Saml2\Core\Cache' => 'Core/Cache.inc',
+    'Saml2\Core\Config' => 'Core/Config.inc',
+    'Saml2\Core\IdPCertificates' => 'Core/IdPCertificates.inc',
+    'Saml2\Core\IdPMetadataCache' => 'Core/IdPMetadataCache.inc',
+    'Saml2\Core\Logger' => 'Core/Logger.inc',
+    'Saml2\Core\LogoutIndex' => 'Core/LogoutIndex.inc',
+    'Saml2\Core\Preload' => 'Core/Preload.inc',
+    'Saml2\Core\PrivilegeCache' => 'Core/PrivilegeCache.inc',
+    'Saml2\Core\RateLimiter' => 'Core/RateLimiter.inc',
+    'Saml2\Core\ReplayCache' => 'Core/ReplayCache.inc',
+    'Saml2\Core\ResponsePrefilter' => 'Core/ResponsePrefilter.inc',
+    'Saml2\Core\SettingsSnapshot' => 'Core/SettingsSnapshot.inc',
+    'Saml2\Core\SPMetadata' => 'Core/SPMetadata.inc',
+    'Saml2\Core\Stats' => 'Core/Stats.inc',
+    'Saml2\Core\TestCase' => 'Core/TestCase.inc',
+    'Saml2\Core\TestCaseRetry' => 'Core/TestCaseRetry.inc',
+    'Saml2\Errors\ConfigError' => 'Errors/ConfigError.inc',
+    'Saml2\Errors\SystemError' => 'Errors/SystemError.inc',
+    'Saml2\Errors\UpdateError' => 'Errors/UpdateError.inc',
+    'Saml2\Errors\ValidationError' => 'Errors/ValidationError.inc',
+];
@@ -15,15 +15,38 @@
 //   limitations under the License.
 
 require_once 'Saml2/autoload.php';
+require_once 'Saml2/Core/Update.inc';
 
 use Saml2\Core\Config;
+use Saml2\Core\IdPMetadataCache;
+use Saml2\Core\LogoutIndex;
+use Saml2\Core\Preload;
+use Saml2\Core\SettingsSnapshot;
+use Saml2\Core\Stats;
 use Saml2\Errors\UpdateError;
-use function Saml2\Core\Update\fetch_pkg_releases;
 use function Saml2\Core\Update\get_pkg_version;
+use function Saml2\Core\Update\refresh_pkg_releases;
 use function Saml2\Core\Update\update_pkg;
-use const Saml2\Core\Update\RELEASES_CACHE_FILE;
+use const Saml2\Core\Update\RELEASES_REFRESH_NOT_MODIFIED;
+use const Saml2\Core\Update\RELEASES_REFRESH_UNCHANGED;
+use const Saml2\Core\Update\RELEASES_URL;
 
 const REFRESH_CACHE_CMD = '/usr/local/pkg/Saml2/manage.php refreshcache';
+const REFRESH_METADATA_CMD = '/usr/local/pkg/Saml2/manage.php refreshmetadata';
+const PRUNE_SESSIONS_CMD = '/usr/local/pkg/Saml2/manage.php prunesessions';
+const CRON_JOBS = [
+    ['minute' => '@hourly', 'who' => 'root', 'command' => REFRESH_CACHE_CMD],
+    ['minute' => '@hourly', 'who' => 'root', 'command' => PRUNE_SESSIONS_CMD],
+    [
+        'minute' => '*/15',
+        'hour' => '*',
+        'mday' => '*',
+        'month' => '*',
+        'wday' => '*',
+        'who' => 'root',
+        'command' => REFRESH_METADATA_CMD,
+    ],
+];
 
 /**
  * Performs a backup of the SAML2 configuration
@@ -32,17 +55,22 @@ function backup(): void {
     # Start the backup process
     echo 'Backing up SAML2 configuration... ';
     $config = new Config();
-    $backup_success = $config->backup();
+    $backup_status = $config->backup();
 
-    # Exit on non-zero exit code if the backup fails
-    if (!$backup_success) {
-        echo 'failed.' . PHP_EOL;
-        exit(1);
+    switch ($backup_status) {
+        case Config::BACKUP_SUCCESS:
+            echo 'done.' . PHP_EOL;
+            exit(0);
+        case Config::BACKUP_UNCHANGED:
+            echo 'already up to date.' . PHP_EOL;
+            exit(0);
+        case Config::BACKUP_FAILURE:
+            echo 'failed.' . PHP_EOL;
+            exit(1);
+        default:
+            echo 'unknown error.' . PHP_EOL;
+            exit(1);
     }
-
-    # Otherwise, backup was successful. Print success message.
-    echo 'done.' . PHP_EOL;
-    exit(0);
 }
 
 /**
@@ -61,6 +89,9 @@ function restore(): void {
         case Config::RESTORE_NO_BACKUP:
             echo 'nothing to restore.' . PHP_EOL;
             exit(0);
+        case Config::RESTORE_UNCHANGED:
+            echo 'already up to date.' . PHP_EOL;
+            exit(0);
         case Config::RESTORE_FAILURE:
             echo 'failed.' . PHP_EOL;
             exit(1);
@@ -72,40 +103,141 @@ function restore(): void {
 
 /**
  * Refreshes the package releases cache
+ * @param string $release_url The URL to fetch the package releases from, e.g. to use an internal mirror.
  */
-function refreshcache(): void {
+function refreshcache(string $release_url = RELEASES_URL): void {
     # Start the cache refresh process
     echo 'Refreshing package cache files... ';
     try {
-        $cache = fetch_pkg_releases();
+        $result = refresh_pkg_releases($release_url);
     } catch (Error $e) {
         echo 'failed: ' . $e->getMessage() . PHP_EOL;
         exit(1);
     }
 
-    # If no releases were fetched, print an error message
-    if (empty($cache)) {
-        echo 'failed to fetch releases to cache.' . PHP_EOL;
-        exit(1);
+    echo match ($result) {
+        RELEASES_REFRESH_NOT_MODIFIED => 'not modified.',
+        RELEASES_REFRESH_UNCHANGED => 'unchanged.',
+        default => 'done.',
+    } . PHP_EOL;
+    exit(0);
+}
+
+/**
+ * Refreshes the cached IdP metadata ahead of its expiry
+ * @param bool $force Refresh the metadata even if the cached metadata is not due for a refresh yet.
+ */
+function refreshmetadata(bool $force = false): void {
+    echo 'Refreshing IdP metadata cache... ';
+    $config = new Config();
+    $metadata_cache = new IdPMetadataCache($config);
+
+    switch ($metadata_cache->refresh(force: $force)) {
+        case IdPMetadataCache::REFRESH_UPDATED:
+            SettingsSnapshot::compile($config);
+            echo 'done.' . PHP_EOL;
+            exit(0);
+        case IdPMetadataCache::REFRESH_NOT_MODIFIED:
+            SettingsSnapshot::compile($config);
+            echo 'not modified.' . PHP_EOL;
+            exit(0);
+        case IdPMetadataCache::REFRESH_NOT_DUE:
+            echo 'not due.' . PHP_EOL;
+            exit(0);
+        case IdPMetadataCache::REFRESH_NOT_CONFIGURED:
+            echo 'no IdP metadata URL configured.' . PHP_EOL;
+            exit(0);
+        default:
+            echo 'failed: ' . $metadata_cache->last_error . PHP_EOL;
+            exit(1);
     }
+}
 
-    # Otherwise, write the cache to the file
-    file_put_contents(RELEASES_CACHE_FILE, json_encode($cache));
+/**
+ * Removes the logout index entries of sessions that have ended or expired
+ */
+function prunesessions(): void {
+    echo 'Pruning SAML2 logout index... ';
+    $removed = (new LogoutIndex())->prune();
+    echo "removed $removed ended session(s)." . PHP_EOL;
+    exit(0);
+}
+
+/**
+ * Registers, unregisters or displays the status of the OPcache preload script
+ * @param string $action The action to perform: `enable`, `disable` or `status`.
+ */
+function preload(string $action): void {
+    switch ($action) {
+        case 'enable':
+            echo 'Registering OPcache preload script... ';
+            $result = Preload::enable();
+            break;
+        case 'disable':
+            echo 'Unregistering OPcache preload script... ';
+            $result = Preload::disable();
+            break;
+        case 'status':
+            preload_status();
+            break;
+        default:
+            echo "error: unknown preload action: '$action'" . PHP_EOL;
+            help();
+            exit(1);
+    }
+
+    if (!$result) {
+        echo 'failed.' . PHP_EOL;
+        exit(1);
+    }
     echo 'done.' . PHP_EOL;
+
+    # PHP-FPM keeps preloaded classes until it restarts, never let it run the classes of another package version
+    $status = Preload::get_status();
+    if ($status['stale']) {
+        echo 'Scheduling a PHP-FPM restart to replace the classes preloaded from another version... ';
+        Preload::restart_php_fpm();
+        echo 'done.' . PHP_EOL;
+    } elseif ($status['registered'] !== $status['active']) {
+        echo 'Restart PHP-FPM to apply the change, e.g. using the console menu or by rebooting.' . PHP_EOL;
+    }
     exit(0);
 }
 
+/**
+ * Prints whether the OPcache preload script is registered and whether the running PHP-FPM process preloaded it
+ */
+function preload_status(): void {
+    $status = Preload::get_status();
+    echo 'OPcache preload script: ' . ($status['registered'] ? 'registered' : 'not registered') . PHP_EOL;
+    if (!$status['active']) {
+        echo 'PHP-FPM: not preloaded' . PHP_EOL;
+        exit($status['registered'] ? 1 : 0);
+    }
+
+    $preloaded_at = date('Y-m-d H:i:s', $status['preloaded_at']);
+    echo "PHP-FPM: preloaded {$status['files']} files from version {$status['version']} at $preloaded_at" . PHP_EOL;
+    foreach ($status['failed'] as $file) {
+        echo "PHP-FPM: failed to preload $file" . PHP_EOL;
+    }
+    if ($status['stale']) {
+        echo 'PHP-FPM: preloaded version is not the installed version, restart PHP-FPM.' . PHP_EOL;
+    }
+    exit($status['stale'] or $status['failed'] or !$status['registered'] ? 1 : 0);
+}
+
 /**
  * Sets up cron schedules for the package
  */
 function setupschedule(): void {
-    # Setup the cron job to run hourly
+    # Setup the cron jobs for the package
     echo 'Setting up cron schedules... ';
-    $cron_job = ['minute' => '@hourly', 'who' => 'root', 'command' => REFRESH_CACHE_CMD];
     $cron_jobs = config_get_path('cron/item', []);
-    $cron_jobs[] = $cron_job;
+    foreach (CRON_JOBS as $cron_job) {
+        $cron_jobs[] = $cron_job;
+    }
     config_set_path('cron/item', $cron_jobs);
-    write_config('Created cron job for pfSense-pkg-saml2-auth package');
+    write_config('Created cron jobs for pfSense-pkg-saml2-auth package');
     configure_cron();
 
     echo 'done.' . PHP_EOL;
@@ -118,14 +250,18 @@ function setupschedule(): void {
 function removeschedule(): void {
     echo 'Removing cron schedules... ';
 
-    # Remove any existing cron jobs for this command
+    # Remove any existing cron jobs for this package's commands
+    $commands = array_column(CRON_JOBS, 'command');
+    $removed = false;
     foreach (config_get_path('cron/item', []) as $index => $cron) {
-        if ($cron['command'] === REFRESH_CACHE_CMD) {
+        if (in_array($cron['command'], $commands)) {
             config_del_path("cron/item/$index");
-            write_config('Removed cron job for pfSense-pkg-saml2-auth package');
-            break;
+            $removed = true;
         }
     }
+    if ($removed) {
+        write_config('Removed cron jobs for pfSense-pkg-saml2-auth package');
+    }
 
     # Apply the changes to cron
     configure_cron();
@@ -255,6 +391,67 @@ function run_tests(string|null $contains = ''): void {
     exit($exit_code);
 }
 
+/**
+ * Runs all (or select) Benchmark classes in \Saml2\Benchmarks and prints the measured metrics. This is only intended
+ * to measure the performance of this package during development and should not be used on live installs.
+ * @param $contains string|null Only run benchmarks that contain this sub-string in the benchmark name.
+ */
+function run_benchmarks(string|null $contains = ''): void {
+    $exit_code = 0;
+
+    # Import each benchmark class and run the benchmark
+    foreach (glob('/usr/local/pkg/Saml2/Benchmarks/*.inc') as $benchmark_file) {
+        require_once $benchmark_file;
+        $benchmark = '\\Saml2\\Benchmarks\\' . str_replace('.inc', '', basename($benchmark_file));
+
+        # Only run this benchmark if the benchmark name contains the $contains string
+        if (!str_contains($benchmark, $contains)) {
+            continue;
+        }
+
+        $benchmark_obj = new $benchmark();
+        try {
+            $results = $benchmark_obj->run();
+        } catch (Exception | Error $error) {
+            echo "$benchmark::$benchmark_obj->method: failed: {$error->getMessage()}" . PHP_EOL;
+            $exit_code = 1;
+            continue;
+        }
+
+        # Print each metric on a single line for easy comparison between runs
+        foreach ($results as $method => $metrics) {
+            $metrics_str = implode(' ', array_map(fn($k, $v) => "$k=$v", array_keys($metrics), $metrics));
+            echo "$benchmark::$method: $metrics_str" . PHP_EOL;
+        }
+    }
+
+    exit($exit_code);
+}
+
+/**
+ * Prints the latency statistics of each SSO phase recorded in the rolling histogram
+ * @param bool $reset Remove all recorded statistics instead of printing them.
+ */
+function stats(bool $reset = false): void {
+    if ($reset) {
+        echo 'Resetting SSO statistics... ';
+        Stats::reset();
+        echo 'done.' . PHP_EOL;
+        exit(0);
+    }
+
+    $stats = Stats::read();
+    if (!$stats) {
+        echo 'No SSO statistics recorded yet.' . PHP_EOL;
+        exit(0);
+    }
+    foreach ($stats as $phase => $metrics) {
+        $metrics_str = implode(' ', array_map(fn($k, $v) => "$k=$v", array_keys($metrics), $metrics));
+        echo "$phase: $metrics_str" . PHP_EOL;
+    }
+    exit(0);
+}
+
 /**
  * Prints the installed version of the pfSense-pkg-saml2-auth package
  */
@@ -272,16 +469,21 @@ function help(): void {
     echo 'SYNTAX:' . PHP_EOL;
     echo '  pfsense-saml2 <command> <args>' . PHP_EOL;
     echo 'COMMANDS:' . PHP_EOL;
-    echo '  backup              : Makes a backup of the SAML2 configuration' . PHP_EOL;
-    echo '  restore             : Restores the SAML2 configuration from the JSON backup' . PHP_EOL;
-    echo '  refreshcache        : Refreshes the releases cache files used for updates' . PHP_EOL;
-    echo '  setupschedule       : Sets up cron schedules for the package' . PHP_EOL;
-    echo '  removeschedule      : Removes cron schedules for the package' . PHP_EOL;
-    echo '  update              : Update to the latest version of the package' . PHP_EOL;
-    echo '  revert <version>    : Revert to a specific version of the package' . PHP_EOL;
-    echo '  runtests [<filter>] : Runs all test cases, or only those that contain <filter> in the test name' . PHP_EOL;
-    echo '  version             : Displays the current version of pfSense-pkg-saml2-auth' . PHP_EOL;
-    echo '  help                : Displays the help page (this page)' . PHP_EOL . PHP_EOL;
+    echo '  backup                             : Makes a backup of the SAML2 configuration' . PHP_EOL;
+    echo '  restore                            : Restores the SAML2 configuration from the JSON backup' . PHP_EOL;
+    echo '  refreshcache [--release-url=<url>] : Refreshes the releases cache files used for updates' . PHP_EOL;
+    echo '  refreshmetadata [--force]          : Refreshes the cached IdP metadata if it is due' . PHP_EOL;
+    echo '  prunesessions                      : Removes ended sessions from the SAML2 logout index' . PHP_EOL;
+    echo '  preload <enable|disable|status>    : Manages the OPcache preload script for PHP-FPM' . PHP_EOL;
+    echo '  setupschedule                      : Sets up cron schedules for the package' . PHP_EOL;
+    echo '  removeschedule                     : Removes cron schedules for the package' . PHP_EOL;
+    echo '  update                             : Update to the latest version of the package' . PHP_EOL;
+    echo '  revert <version>                   : Revert to a specific version of the package' . PHP_EOL;
+    echo '  runtests [<filter>]                : Runs all test cases, or those with <filter> in the name' . PHP_EOL;
+    echo '  benchmark [<filter>]               : Runs all benchmarks, or those with <filter> in the name' . PHP_EOL;
+    echo '  stats [--reset]                    : Displays the latency statistics of each SSO phase' . PHP_EOL;
+    echo '  version                            : Displays the current version of pfSense-pkg-saml2-auth' . PHP_EOL;
+    echo '  help                               : Displays the help page (this page)' . PHP_EOL . PHP_EOL;
 }
 
 /**
@@ -297,7 +499,17 @@ function main(array $argv): void {
             restore();
             break;
         case 'refreshcache':
-            refreshcache();
+            $release_url = str_starts_with($argv[2] ?? '', '--release-url=') ? substr($argv[2], 14) : RELEASES_URL;
+            refreshcache(release_url: $release_url);
+            break;
+        case 'refreshmetadata':
+            refreshmetadata(force: ($argv[2] ?? '') === '--force');
+            break;
+        case 'prunesessions':
+            prunesessions();
+            break;
+        case 'preload':
+            preload(action: $argv[2] ?? '');
             break;
         case 'setupschedule':
             setupschedule();
@@ -314,6 +526,12 @@ function main(array $argv): void {
         case 'runtests':
             run_tests(contains: $argv[2] ?? '');
             break;
+        case 'benchmark':
+            run_benchmarks(contains: $argv[2] ?? '');
+            break;
+        case 'stats':
+            stats(reset: ($argv[2] ?? '') === '--reset');
+            break;
         case 'version':
             version();
             break;
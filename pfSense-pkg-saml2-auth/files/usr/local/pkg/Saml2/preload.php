@@ -0,0 +1,29 @@
+<?php
+//    Copyright 2025 Jared Hendrickson
+//
+//   Licensed under the Apache License, Version 2.0 (the "License");
+//   you may not use this file except in compliance with the License.
+//   You may obtain a copy of the License at
+//
+//       http://www.apache.org/licenses/LICENSE-2.0
+//
+//   Unless required by applicable law or agreed to in writing, software
+//   distributed under the License is distributed on an "AS IS" BASIS,
+//   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//   See the License for the specific language governing permissions and
+//   limitations under the License.
+
+# The OPcache preload script registered by `pfsense-saml2 preload enable`. PHP runs this once when PHP-FPM starts.
+
+# Only PHP-FPM benefits from preloading, other PHP processes would compile all classes each time they are started
+if (PHP_SAPI !== 'fpm-fcgi') {
+    return;
+}
+
+# PHP-FPM does not start if the preload script fails, so never let the webConfigurator go down because of preloading
+try {
+    require_once __DIR__ . '/Core/Preload.inc';
+    Saml2\Core\Preload::run(__DIR__);
+} catch (Throwable $error) {
+    error_log('pfSense-pkg-saml2-auth: OPcache preloading failed: ' . $error->getMessage());
+}
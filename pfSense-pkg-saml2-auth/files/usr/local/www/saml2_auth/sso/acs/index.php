@@ -14,8 +14,12 @@
 //   limitations under the License.
 
 use Saml2\Core\Auth;
+use Saml2\Core\RateLimiter;
 
 require_once 'Saml2/autoload.php';
+
+# Reject clients exceeding the SSO rate limits before starting a session
+RateLimiter::enforce();
 session_start();
 
 # Create the saml2 authentication object
@@ -17,8 +17,12 @@ require_once 'Saml2/autoload.php';
 
 use Saml2\Core\Auth;
 use Saml2\Core\Config;
+use Saml2\Core\RateLimiter;
+
+# Reject clients exceeding the SSO rate limits before starting a session
+RateLimiter::enforce();
 
 # Start SSO
 $auth = new Auth();
-$config = new Config();
+$config = Config::instance();
 $auth->sso($config->sp_base_url . Auth::SSO_REDIRECT_URL);
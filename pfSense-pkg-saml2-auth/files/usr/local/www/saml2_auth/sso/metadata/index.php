@@ -16,11 +16,29 @@
 require_once 'Saml2/autoload.php';
 
 use Saml2\Core\Auth;
+use Saml2\Core\Config;
+use Saml2\Core\RateLimiter;
+use Saml2\Core\SPMetadata;
+use Saml2\Core\Stats;
 
-session_start();
+# Reject clients exceeding the SSO rate limits before loading the package configuration
+RateLimiter::enforce();
 
-# Create the saml2 authentication object
-$saml2_auth = new Auth();
+# Obtain the precomputed SP metadata, this does not require a session or the IdP
+Stats::start('metadata');
+$metadata = SPMetadata::get(Config::instance());
+if (!$metadata) {
+    Stats::fail('metadata');
+    header('Location: ' . Auth::SSO_ERROR_URL);
+    exit();
+}
 
-# Return SP metadata
-$saml2_auth->metadata();
+# Return SP metadata, or only its headers if the client already has the current SP metadata
+foreach (SPMetadata::get_headers($metadata) as $name => $value) {
+    header("$name: $value");
+}
+if (SPMetadata::is_not_modified($metadata, $_SERVER)) {
+    http_response_code(304);
+    exit();
+}
+echo $metadata['xml'];
@@ -4,7 +4,7 @@ use Saml2\Core\Config;
 
 require_once 'Saml2/autoload.php';
 
-$conf = new Config();
+$conf = Config::instance();
 header('Content-Type: application/json');
 
 # Do not allow this endpoint to be used if not in debug mode
@@ -0,0 +1,26 @@
+<?php
+//    Copyright 2025 Jared Hendrickson
+//
+//   Licensed under the Apache License, Version 2.0 (the "License");
+//   you may not use this file except in compliance with the License.
+//   You may obtain a copy of the License at
+//
+//       http://www.apache.org/licenses/LICENSE-2.0
+//
+//   Unless required by applicable law or agreed to in writing, software
+//   distributed under the License is distributed on an "AS IS" BASIS,
+//   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//   See the License for the specific language governing permissions and
+//   limitations under the License.
+
+use Saml2\Core\Auth;
+use Saml2\Core\RateLimiter;
+
+require_once 'Saml2/autoload.php';
+
+# Reject clients exceeding the SSO rate limits before starting a session
+RateLimiter::enforce();
+
+# Process the SAML2 logout request or response from the IdP
+$saml2_auth = new Auth();
+$saml2_auth->sls();
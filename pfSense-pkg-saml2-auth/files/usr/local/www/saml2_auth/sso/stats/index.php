@@ -0,0 +1,37 @@
+<?php
+//    Copyright 2025 Jared Hendrickson
+//
+//   Licensed under the Apache License, Version 2.0 (the "License");
+//   you may not use this file except in compliance with the License.
+//   You may obtain a copy of the License at
+//
+//       http://www.apache.org/licenses/LICENSE-2.0
+//
+//   Unless required by applicable law or agreed to in writing, software
+//   distributed under the License is distributed on an "AS IS" BASIS,
+//   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//   See the License for the specific language governing permissions and
+//   limitations under the License.
+
+use Saml2\Core\Stats;
+
+require_once 'Saml2/autoload.php';
+
+header('Content-Type: application/json');
+
+# Require user to be logged in to access this endpoint
+session_start();
+if (!$_SESSION['Logged_In']) {
+    http_response_code(401);
+    echo json_encode(['error' => 'Unauthorized']);
+    exit();
+}
+
+# Require the user to have admin privileges (i.e. the 'WebCfg - All pages' privilege)
+if (!in_array('*', getAllowedPages($_SESSION['Username']) ?: [])) {
+    http_response_code(403);
+    echo json_encode(['error' => 'Forbidden']);
+    exit();
+}
+
+echo json_encode(Stats::read());
@@ -17,6 +17,8 @@ require_once 'guiconfig.inc';
 require_once 'Saml2/autoload.php';
 
 use Saml2\Core\Config;
+use Saml2\Core\IdPCertificates;
+use Saml2\Core\IdPMetadataCache;
 
 # Initialize the pfSense UI page (note: $pgtitle must be defined before including head.inc)
 $pgtitle = [gettext('System'), gettext('SAML2'), gettext('Settings')];
@@ -38,14 +40,46 @@ if ($_POST['save']) {
     $_POST['custom_conf'] = base64_encode($_POST['custom_conf']);
     $conf->from_internal($_POST);
     try {
-        $conf->save();
-        print_apply_result_box(0);
+        $changed = $conf->save() !== Config::SAVE_UNCHANGED;
+        if ($changed) {
+            print_apply_result_box(0);
+        } else {
+            print_info_box('No changes were made to the SAML2 configuration.', 'info');
+        }
+
+        # Prime the IdP metadata cache so the next SSO login does not need to fetch it. The page waits on the download,
+        # so only fetch when the configuration changed or nothing is cached yet, and use the shorter login timeout.
+        $metadata_cache = new IdPMetadataCache($conf);
+        $refresh = IdPMetadataCache::REFRESH_NOT_DUE;
+        if ($changed or !$metadata_cache->read()) {
+            $refresh = $metadata_cache->refresh(force: true, timeout: IdPMetadataCache::LOGIN_DOWNLOAD_TIMEOUT);
+        }
+        if ($refresh === IdPMetadataCache::REFRESH_FAILURE) {
+            print_info_box(
+                'IdP metadata could not be fetched: ' . htmlspecialchars($metadata_cache->last_error),
+                'warning',
+            );
+        }
     } catch (Error $e) {
         $input_errors[] = $e->getMessage();
         print_input_errors($input_errors);
     }
 }
 
+# Warn about IdP certificates that have expired or will expire soon
+foreach (IdPCertificates::get_expiring($conf) as $cert) {
+    print_info_box(
+        sprintf(
+            'IdP x509 certificate %s (%s) %s on %s.',
+            htmlspecialchars($cert['subject']),
+            $cert['fingerprint'],
+            $cert['expires_at'] <= time() ? 'expired' : 'will expire',
+            date('Y-m-d', $cert['expires_at']),
+        ),
+        'warning',
+    );
+}
+
 # POPULATE THE GENERAL SECTION OF THE UI
 $general_section = new Form_Section('General');
 $general_section
@@ -94,7 +128,11 @@ $idp_section
             'placeholder' => 'URL or alternate ID',
         ]),
     )
-    ->setHelp('Set the entity ID of the upstream identity provider. This will be provided by your IdP.');
+    ->setHelp(
+        'Set the entity ID of the upstream identity provider. This will be provided by your IdP. If the metadata URL ' .
+            'above points at a federation aggregate containing multiple identity providers, this selects the identity ' .
+            'provider to use.',
+    );
 
 $idp_section
     ->addInput(
@@ -118,9 +156,33 @@ $idp_section
         'Set the groups attribute returned in the SAML assertion. This will be provided by your IdP if supported.',
     );
 
+$idp_section
+    ->addInput(
+        new Form_Input('session_attributes', 'Session Attributes', 'text', $conf->session_attributes, [
+            'placeholder' => 'Comma-separated attribute names',
+        ]),
+    )
+    ->setHelp(
+        'Set additional attributes from the SAML assertion to keep in the user\'s session, separated by commas. By ' .
+            'default, only the NameID and the groups attribute are kept. All attributes are kept in debug mode.',
+    );
+
 $idp_section
     ->addInput(new Form_Textarea('idp_x509_cert', 'Identity Provider x509 Certificate', $conf->idp_x509_cert))
-    ->setHelp('Paste the x509 SAML2 certificate from the upstream identity provider.');
+    ->setHelp(
+        'Paste the x509 SAML2 certificate from the upstream identity provider. Multiple certificates may be pasted ' .
+            'one after another to trust both the current and the next certificate while your IdP rolls them over.',
+    );
+
+$cert_details = array_map(
+    fn($cert) => $cert['fingerprint'] . ' (expires ' . date('Y-m-d', $cert['expires_at']) . ')',
+    IdPCertificates::get($conf),
+);
+$idp_section
+    ->addInput(
+        new Form_StaticText('Identity Provider Certificate Fingerprints', implode('<br>', $cert_details) ?: 'None'),
+    )
+    ->setHelp('Displays the SHA-256 fingerprints of the identity provider certificates above.');
 
 # POPULATE THE SP SECTION OF THE UI
 $sp_section = new Form_Section('Service Provider Settings (SP)');
@@ -146,8 +208,61 @@ $sp_section
     to this URL as the assertion consumer service (ACS).",
     );
 
+$sp_section
+    ->addInput(new Form_StaticText('Service Provider Single Logout URL', "$conf->sp_base_url/saml2_auth/sso/sls/"))
+    ->setHelp(
+        "Displays the service provider's single logout URL. Provide this URL to your IdP to end pfSense sessions when
+    users log out of the IdP. They may refer to this URL as the single logout service (SLS).",
+    );
+
 # POPULATE THE ADVANCED SECTION OF THE UI
 $advanced_section = new Form_Section('Advanced Settings');
+$advanced_section
+    ->addInput(
+        new Form_Input(
+            'acs_max_response_size',
+            'Maximum SAML2 Response Size',
+            'number',
+            $conf->acs_max_response_size,
+            ['min' => 1, 'max' => Config::MAX_ACS_MAX_RESPONSE_SIZE],
+        ),
+    )
+    ->setHelp(
+        'Set the maximum size in KiB of the encoded SAML2 response the IdP may post to the sign-on URL. Larger ' .
+            'responses are rejected before they are parsed.',
+    );
+
+$advanced_section
+    ->addInput(
+        new Form_Input(
+            'rate_limit_per_source',
+            'SSO Rate Limit per Source',
+            'number',
+            $conf->rate_limit_per_source,
+            ['min' => 0, 'max' => Config::MAX_RATE_LIMIT],
+        ),
+    )
+    ->setHelp(
+        'Set the number of requests per minute each source address may make to the SSO endpoints. IPv6 addresses ' .
+            'are limited per /64 prefix. Requests over the limit are rejected with HTTP status 429. Set to 0 to ' .
+            'disable this limit.',
+    );
+
+$advanced_section
+    ->addInput(
+        new Form_Input(
+            'rate_limit_global',
+            'SSO Rate Limit',
+            'number',
+            $conf->rate_limit_global,
+            ['min' => 0, 'max' => Config::MAX_RATE_LIMIT],
+        ),
+    )
+    ->setHelp(
+        'Set the number of requests per minute all source addresses together may make to the SSO endpoints. This ' .
+            'keeps the SSO endpoints from starving the webConfigurator. Set to 0 to disable this limit.',
+    );
+
 $advanced_section
     ->addInput(new Form_Textarea('custom_conf', 'Custom SAML2 configuration', $conf->custom_conf))
     ->setHelp(
@@ -15,6 +15,7 @@
 
 require_once 'guiconfig.inc';
 require_once 'Saml2/autoload.php';
+require_once 'Saml2/Core/Update.inc';
 
 use function Saml2\Core\Update\get_latest_pkg_release_date;
 use function Saml2\Core\Update\get_latest_pkg_version;
@@ -39,7 +39,7 @@ setup(
     long_description=read_readme(),
     long_description_content_type="text/markdown",
     version="0.0.0",
-    packages=["tests", "tests.helpers", "tests.e2e"],
+    packages=["tests", "tests.helpers", "tests.e2e", "tests.bench"],
     install_requires=read_requirements(),
     classifiers=[
         "Programming Language :: Python :: 3",
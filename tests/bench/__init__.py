@@ -0,0 +1 @@
+"""Defines benchmarks measuring the performance of the package on a pfSense instance."""
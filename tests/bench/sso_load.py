@@ -0,0 +1,439 @@
+"""A load generator measuring the SSO login throughput of pfSense and the latency of each hop of an SSO login."""
+
+import argparse
+import datetime
+import html
+import json
+import math
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+import urllib3
+
+from tests.helpers.mock_idp import MockIdP, start_mock_idp
+from tests.helpers.params import Params
+from tests.helpers.pfsense_client import get_pfsense_client
+from tests.helpers.saml2_config import Saml2Config
+
+# The hops of an SP-initiated SSO login, in order
+HOP_SSO = "sso"
+HOP_IDP = "idp"
+HOP_ACS = "acs"
+HOP_REDIRECT = "redirect"
+HOPS = (HOP_SSO, HOP_IDP, HOP_ACS, HOP_REDIRECT)
+PERCENTILES = (50, 95, 99)
+RESULT_VERSION = 1
+FORM_ACTION_PATTERN = re.compile(r'<form[^>]*action="([^"]*)"')
+FORM_INPUT_PATTERN = re.compile(r'<input[^>]*name="([^"]*)"[^>]*value="([^"]*)"')
+
+
+class LoginError(Exception):
+    """
+    Raised when a hop of an SSO login fails.
+
+    Attributes:
+        hop (str): The hop that failed, one of HOPS
+        reason (str): A short description of the failure, used to group failures
+    """
+
+    def __init__(self, hop: str, reason: str) -> None:
+        super().__init__(f"{hop}: {reason}")
+        self.hop = hop
+        self.reason = reason
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Computes a percentile of values using the nearest-rank method.
+
+    Args:
+        values (list[float]): The values, which must not be empty
+        percent (float): The percentile to compute, between 0 and 100
+
+    Returns:
+        float: The smallest value that is greater than or equal to the given percent of the values
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(durations: list[float], attempts: int, errors: int) -> dict:
+    """
+    Summarizes the durations of a hop or of complete logins.
+
+    Args:
+        durations (list[float]): The durations of the successful attempts, in seconds
+        attempts (int): The number of attempts, successful or not
+        errors (int): The number of failed attempts
+
+    Returns:
+        dict: The number of attempts and errors, the error rate and the latency percentiles in milliseconds
+    """
+    summary = {
+        "attempts": attempts,
+        "errors": errors,
+        "error_rate": round(errors / attempts, 4) if attempts else 0.0,
+    }
+    for percent in PERCENTILES:
+        value = percentile(durations, percent) * 1000 if durations else None
+        summary[f"p{percent}_ms"] = round(value, 2) if value is not None else None
+    summary["max_ms"] = round(max(durations) * 1000, 2) if durations else None
+    return summary
+
+
+class SSOLoadTest:
+    """
+    Drives complete SP-initiated SSO logins against pfSense from concurrent virtual users. Each virtual user logs in
+    repeatedly using a new session for each login, without a browser: it follows the redirect to the IdP, posts the
+    IdP's response to the ACS and loads the page the ACS redirects to.
+
+    Attributes:
+        pfsense_url (str): The base URL of the pfSense instance
+        mock_idp (MockIdP): The mock IdP pfSense is configured to use
+        users (int): The number of concurrent virtual users
+        logins (int): The number of logins performed by each virtual user
+        timeout (float): The timeout of each request, in seconds
+    """
+
+    def __init__(
+        self,
+        pfsense_url: str,
+        mock_idp: MockIdP,
+        users: int,
+        logins: int,
+        timeout: float,
+    ) -> None:
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self.pfsense_url = pfsense_url
+        self.mock_idp = mock_idp
+        self.users = users
+        self.logins = logins
+        self.timeout = timeout
+
+    def request(
+        self, timings: dict, hop: str, method, url: str, **kwargs
+    ) -> requests.Response:
+        """
+        Sends the request of a hop and records how long it took.
+
+        Args:
+            timings (dict): The durations of the hops of the current login, in seconds
+            hop (str): The hop the request belongs to
+            method (Callable): The requests session method to send the request with
+            url (str): The URL to send the request to
+            **kwargs: The remaining arguments of the requests session method
+
+        Returns:
+            requests.Response: The response to the request
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        started = time.perf_counter()
+        try:
+            resp = method(url, allow_redirects=False, timeout=self.timeout, **kwargs)
+        except requests.RequestException as exc:
+            raise LoginError(hop, type(exc).__name__) from exc
+        timings[hop] = time.perf_counter() - started
+        return resp
+
+    def login(self) -> dict:
+        """
+        Performs one complete SSO login.
+
+        Returns:
+            dict: The durations of the hops that completed, in seconds, and the error if the login failed
+        """
+        timings = {}
+        try:
+            with requests.Session() as session:
+                session.verify = False
+                self.login_hops(session, timings)
+        except LoginError as exc:
+            return {"timings": timings, "error": exc}
+        return {"timings": timings, "error": None}
+
+    def login_hops(self, session: requests.Session, timings: dict) -> None:
+        """
+        Performs the hops of an SSO login, raising a LoginError when a hop does not respond as expected.
+
+        Args:
+            session (requests.Session): The session of the virtual user, which keeps the pfSense session cookie
+            timings (dict): The durations of the hops of the current login, in seconds
+        """
+        # Start the login, pfSense must redirect to the IdP with an AuthnRequest
+        resp = self.request(
+            timings, HOP_SSO, session.get, f"{self.pfsense_url}/saml2_auth/sso/"
+        )
+        location = resp.headers.get("Location", "")
+        if not resp.is_redirect or not location.startswith(self.mock_idp.sso_url):
+            raise LoginError(HOP_SSO, f"HTTP {resp.status_code}")
+
+        # Obtain the IdP's response and the ACS URL it must be posted to
+        resp = self.request(timings, HOP_IDP, session.get, location)
+        action = FORM_ACTION_PATTERN.search(resp.text)
+        if resp.status_code != 200 or not action:
+            raise LoginError(HOP_IDP, f"HTTP {resp.status_code}")
+        acs_url = html.unescape(action.group(1))
+        form = {
+            name: html.unescape(value)
+            for name, value in FORM_INPUT_PATTERN.findall(resp.text)
+        }
+
+        # Post the response to the ACS, pfSense must redirect to the redirect page instead of the error page
+        resp = self.request(timings, HOP_ACS, session.post, acs_url, data=form)
+        location = urljoin(acs_url, resp.headers.get("Location", ""))
+        if not resp.is_redirect or "/saml2_auth/sso/error/" in location:
+            raise LoginError(
+                HOP_ACS,
+                f"HTTP {resp.status_code} {resp.headers.get('Location', '')}".strip(),
+            )
+
+        # Load the redirect page, which sends the browser to the dashboard
+        resp = self.request(timings, HOP_REDIRECT, session.get, location)
+        if resp.status_code != 200:
+            raise LoginError(HOP_REDIRECT, f"HTTP {resp.status_code}")
+
+    def run_user(self) -> list[dict]:
+        """
+        Performs the logins of one virtual user.
+
+        Returns:
+            list[dict]: The results of each login, see login()
+        """
+        return [self.login() for _ in range(self.logins)]
+
+    def run(self) -> dict:
+        """
+        Runs the load test.
+
+        Returns:
+            dict: The throughput of successful logins, and the latencies and error rates of complete logins and of each
+            hop
+        """
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users) as executor:
+            results = [
+                result
+                for user_results in executor.map(
+                    lambda _: self.run_user(), range(self.users)
+                )
+                for result in user_results
+            ]
+        elapsed = time.perf_counter() - started
+
+        succeeded = [result for result in results if result["error"] is None]
+        hops = {}
+        for hop in HOPS:
+            failed = [
+                result
+                for result in results
+                if result["error"] and result["error"].hop == hop
+            ]
+            durations = [
+                result["timings"][hop]
+                for result in results
+                if hop in result["timings"] and result not in failed
+            ]
+            hops[hop] = summarize(durations, len(durations) + len(failed), len(failed))
+
+        return {
+            "duration_s": round(elapsed, 3),
+            "throughput_per_s": round(len(succeeded) / elapsed, 3),
+            "logins": summarize(
+                [sum(result["timings"].values()) for result in succeeded],
+                len(results),
+                len(results) - len(succeeded),
+            ),
+            "hops": hops,
+            "errors": dict(
+                Counter(str(result["error"]) for result in results if result["error"])
+            ),
+        }
+
+
+def print_results(result: dict, previous: dict = None) -> None:
+    """
+    Prints the results of a load test as a table, including the change from a previous result if given.
+
+    Args:
+        result (dict): The result written by main()
+        previous (dict): A previous result to compare to, if any
+    """
+    print(f"Throughput: {result['results']['throughput_per_s']} logins/s")
+    if previous:
+        print(
+            f"Previous throughput: {previous['results']['throughput_per_s']} logins/s"
+        )
+
+    print(
+        f"{'hop':<10}{'attempts':>10}{'errors':>8}"
+        + "".join(f"{f'p{p} ms':>11}" for p in PERCENTILES)
+    )
+    rows = {"login": result["results"]["logins"], **result["results"]["hops"]}
+    previous_rows = {}
+    if previous:
+        previous_rows = {
+            "login": previous["results"]["logins"],
+            **previous["results"]["hops"],
+        }
+    for name, row in rows.items():
+        line = f"{name:<10}{row['attempts']:>10}{row['errors']:>8}"
+        for percent in PERCENTILES:
+            line += f"{str(row[f'p{percent}_ms']):>11}"
+        previous_p95 = previous_rows.get(name, {}).get("p95_ms")
+        if previous_p95 and row["p95_ms"]:
+            line += f"  (p95 {row['p95_ms'] - previous_p95:+.2f} ms)"
+        print(line)
+
+    for error, count in result["results"]["errors"].items():
+        print(f"error: {count} x {error}")
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    Args:
+        args (list[str]): The command line arguments, excluding the program name
+
+    Returns:
+        argparse.Namespace: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Measure the SSO login throughput of pfSense and the latency of each hop of an SSO login."
+    )
+    parser.add_argument(
+        "--users",
+        "-u",
+        dest="users",
+        type=int,
+        default=10,
+        help="The number of concurrent virtual users.",
+    )
+    parser.add_argument(
+        "--logins",
+        "-n",
+        dest="logins",
+        type=int,
+        default=20,
+        help="The number of logins performed by each virtual user.",
+    )
+    parser.add_argument(
+        "--idp-latency",
+        dest="idp_latency",
+        type=float,
+        default=0.0,
+        help="The number of seconds the mock IdP waits before answering each request.",
+    )
+    parser.add_argument(
+        "--timeout",
+        dest="timeout",
+        type=float,
+        default=30.0,
+        help="The timeout of each request, in seconds.",
+    )
+    parser.add_argument(
+        "--label",
+        "-l",
+        dest="label",
+        type=str,
+        default="",
+        help="A label stored in the result to identify the run, e.g. the pfSense instance or change tested.",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        dest="output",
+        type=str,
+        default=None,
+        help="The path to write the JSON result to. Defaults to sso_load-<timestamp>.json.",
+    )
+    parser.add_argument(
+        "--compare",
+        "-c",
+        dest="compare",
+        type=str,
+        default=None,
+        help="The path of a previous JSON result to compare the results to.",
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> int:
+    """
+    Configures pfSense to use the mock IdP with rate limits disabled, runs the load test, restores the default test
+    configuration and writes the JSON result.
+
+    Args:
+        args (list[str]): The command line arguments, excluding the program name
+
+    Returns:
+        int: The exit code, 1 if any login failed
+    """
+    args = parse_args(args)
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    params = Params()
+    client = get_pfsense_client()
+    mock_idp = start_mock_idp(
+        host=params.idp_host,
+        name_id=params.idp_expected_nameid or "pfrest",
+        groups=[params.idp_expected_group or "staff"],
+        groups_attribute="groups",
+    )
+    mock_idp.configure(latency=args.idp_latency)
+
+    # Give the logged in users privileges and disable the rate limits, which would reject most of the logins
+    group = client.add_user_group(name=mock_idp.groups[0], privileges=["page-all"])
+    conf = Saml2Config(
+        idp_metadata_url=mock_idp.metadata_url,
+        idp_entity_id=mock_idp.entity_id,
+        idp_sign_on_url=mock_idp.sso_url,
+        idp_groups_attribute=mock_idp.groups_attribute,
+        idp_x509_cert=mock_idp.x509_cert,
+        debug_mode=False,
+        rate_limit_per_source=0,
+        rate_limit_global=0,
+    )
+    conf.save()
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        test = SSOLoadTest(
+            params.pfsense_url, mock_idp, args.users, args.logins, args.timeout
+        )
+        results = test.run()
+    finally:
+        Saml2Config().save()
+        client.delete_user_group(group["data"]["id"])
+
+    result = {
+        "version": RESULT_VERSION,
+        "label": args.label,
+        "started_at": started_at.isoformat(),
+        "pfsense_url": params.pfsense_url,
+        "package_version": client.run_command(
+            "cat /var/cache/pfSense-pkg-saml2-auth/version"
+        ).strip(),
+        "users": args.users,
+        "logins_per_user": args.logins,
+        "idp_latency_s": args.idp_latency,
+        "results": results,
+    }
+    output = args.output or f"sso_load-{started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(result, output_file, indent=4)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as previous_file:
+            previous = json.load(previous_file)
+    print_results(result, previous)
+    print(f"Result written to {output}")
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
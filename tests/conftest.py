@@ -3,12 +3,49 @@
 import pytest
 from playwright.sync_api import Browser, sync_playwright
 
+from tests.helpers.mock_idp import MockIdP, get_mock_idp, start_mock_idp
 from tests.helpers.params import Params
-from tests.helpers.pfsense_client import PfSenseClient
+from tests.helpers.pfsense_client import PfSenseClient, get_pfsense_client
 from tests.helpers.saml2_config import Saml2Config
+from tests.helpers.target_lock import TargetLock
 
 # pylint: disable=redefined-outer-name
 
+SAML2_CONFIG_GROUP = pytest.StashKey[int]()
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    """
+    Registers the pytest-xdist marker used to group tests, so the tests can also run without pytest-xdist installed.
+    When running in parallel, the controller prepares the mock IdP shared by the workers before they are started.
+    """
+    config.addinivalue_line(
+        "markers", "xdist_group(name): run all tests of the group on the same worker"
+    )
+    if getattr(config.option, "numprocesses", None) and not hasattr(
+        config, "workerinput"
+    ):
+        Params.share_mock_idp()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(items: list[pytest.Item]) -> None:
+    """
+    Groups the tests by the SAML2 configuration fixture they require, so each configuration is only set once for
+    consecutive tests requiring it. The tests of a group are kept in their original order, and run on the same worker
+    when running in parallel using `--dist loadgroup`. This must run before pytest-xdist reads the groups.
+    """
+    groups = {}
+    for item in items:
+        group = next(
+            (name for name in item.fixturenames if name.startswith("saml2_config")), ""
+        )
+        groups.setdefault(group, len(groups))
+        if group:
+            item.add_marker(pytest.mark.xdist_group(group))
+        item.stash[SAML2_CONFIG_GROUP] = groups[group]
+    items.sort(key=lambda item: item.stash[SAML2_CONFIG_GROUP])
+
 
 @pytest.fixture(scope="session")
 def params() -> Params:
@@ -18,6 +55,70 @@ def params() -> Params:
     return Params()
 
 
+def get_target_lock(
+    params: Params, tmp_path_factory: pytest.TempPathFactory
+) -> TargetLock:
+    """
+    Obtains the lock on the pfSense instance the tests run against, which is shared by all workers testing against it
+    """
+    # The parent of each worker's temporary directory is shared by all workers
+    return TargetLock(
+        tmp_path_factory.getbasetemp().parent / f"pfsense-{params.pfsense_host}.lock"
+    )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def saml2_config_restore(
+    params: Params,
+    pfsense_client: PfSenseClient,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    """
+    Pytest fixture restoring the default SAML2 configuration on pfSense after the test session, since the configuration
+    fixtures leave pfSense in the configuration the last test required. When the tests run in parallel, the workers
+    testing against the same pfSense instance pass on the configuration they last set, so a finishing worker only
+    restores the default configuration if another worker set a different configuration since.
+    """
+    yield
+    if not params.worker:
+        Saml2Config(client=pfsense_client).save()
+        return
+
+    with get_target_lock(params, tmp_path_factory) as state:
+        pfsense_client.saml2_config_hash = state.get("saml2_config_hash")
+        Saml2Config(client=pfsense_client).save()
+        state["saml2_config_hash"] = pfsense_client.saml2_config_hash
+
+
+@pytest.fixture(autouse=True)
+def pfsense_target_lock(
+    params: Params,
+    pfsense_client: PfSenseClient,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    """
+    Pytest fixture giving each test exclusive use of its pfSense instance when the tests run in parallel. Workers
+    testing against the same pfSense instance take turns, and pass on the SAML2 configuration they last set so the
+    next worker does not set it again if it requires the same configuration. Their mock IdPs share a port, so each
+    worker only serves it while it holds the pfSense instance.
+    """
+    if not params.worker:
+        yield
+        return
+
+    idp = get_mock_idp()
+    with get_target_lock(params, tmp_path_factory) as state:
+        pfsense_client.saml2_config_hash = state.get("saml2_config_hash")
+        if idp:
+            idp.start()
+        try:
+            yield
+        finally:
+            if idp:
+                idp.stop()
+            state["saml2_config_hash"] = pfsense_client.saml2_config_hash
+
+
 @pytest.fixture
 def saml2_config_default() -> Saml2Config:
     """
@@ -45,10 +146,6 @@ def saml2_config_manual() -> Saml2Config:
     conf.save()
     yield conf
 
-    # After test, restore to default valid config
-    conf = Saml2Config()
-    conf.save()
-
 
 @pytest.fixture
 def saml2_config_auto() -> Saml2Config:
@@ -66,10 +163,6 @@ def saml2_config_auto() -> Saml2Config:
     conf.save()
     yield conf
 
-    # After test, restore to default valid config
-    conf = Saml2Config()
-    conf.save()
-
 
 @pytest.fixture
 def saml2_config_no_groups() -> Saml2Config:
@@ -84,9 +177,49 @@ def saml2_config_no_groups() -> Saml2Config:
     conf.save()
     yield conf
 
-    # After test, restore to default valid config
-    conf = Saml2Config()
+
+@pytest.fixture
+def mock_idp(params: Params) -> MockIdP:
+    """
+    Pytest fixture to provide the mock IdP. Tests requiring the mock IdP are skipped unless the tests run against the
+    mock IdP, since pfSense and the browsers can only reach the mock IdP at the configured IdP host in that case.
+    Changes made to the mock IdP using MockIdP.configure() are undone after the test.
+
+    Returns:
+        MockIdP: The running mock IdP
+    """
+    if not params.idp_mock:
+        pytest.skip(
+            "requires the mock IdP, set PFSENSE_PKG_SAML2_AUTH_IDP_MOCK to run it"
+        )
+
+    idp = start_mock_idp(
+        host=params.idp_host,
+        name_id=params.idp_expected_nameid or "pfrest",
+        groups=[params.idp_expected_group] if params.idp_expected_group else [],
+        groups_attribute=params.idp_groups_attribute or "groups",
+    )
+    yield idp
+    idp.reset()
+
+
+@pytest.fixture
+def saml2_config_mock_idp(mock_idp: MockIdP) -> Saml2Config:
+    """
+    Pytest fixture to configure SAML2 to use the mock IdP, even when the tests run against an external IdP.
+
+    Returns:
+        Saml2Config: Configuration object using the mock IdP
+    """
+    conf = Saml2Config(
+        idp_metadata_url=mock_idp.metadata_url,
+        idp_entity_id=mock_idp.entity_id,
+        idp_sign_on_url=mock_idp.sso_url,
+        idp_groups_attribute=mock_idp.groups_attribute,
+        idp_x509_cert=mock_idp.x509_cert,
+    )
     conf.save()
+    yield conf
 
 
 @pytest.fixture
@@ -131,10 +264,12 @@ def firefox_browser() -> Browser:
 @pytest.fixture(scope="session")
 def pfsense_client() -> PfSenseClient:
     """
-    Pytest fixture to provide a PfSenseClient instance for tests
+    Pytest fixture to provide the PfSenseClient shared by all tests. Its pooled connections are closed after the test
+    session.
     """
-    client = PfSenseClient()
-    return client
+    client = get_pfsense_client()
+    yield client
+    client.close()
 
 
 @pytest.fixture
@@ -0,0 +1,40 @@
+"""Tests for the HTTP caching of the SP metadata endpoint."""
+
+import pytest
+import requests
+
+from tests.helpers.params import Params
+
+
+@pytest.mark.usefixtures("saml2_config_default")
+def test_sp_metadata_caching(params: Params) -> None:
+    """
+    Test that the SP metadata is served with caching headers and revalidated with 304 responses.
+    """
+    metadata_url = f"{params.pfsense_url}/saml2_auth/sso/metadata/"
+
+    # Ensure the SP metadata is served with its validators
+    metadata_resp = requests.get(metadata_url, verify=False, timeout=30)
+    assert metadata_resp.status_code == 200
+    assert "EntityDescriptor" in metadata_resp.text
+    assert metadata_resp.headers["Content-Type"].startswith("text/xml")
+    assert "max-age=" in metadata_resp.headers["Cache-Control"]
+    assert "Set-Cookie" not in metadata_resp.headers
+    etag = metadata_resp.headers["ETag"]
+    last_modified = metadata_resp.headers["Last-Modified"]
+
+    # Ensure clients with the current SP metadata receive an empty 304 response
+    for headers in ({"If-None-Match": etag}, {"If-Modified-Since": last_modified}):
+        cached_resp = requests.get(
+            metadata_url, headers=headers, verify=False, timeout=30
+        )
+        assert cached_resp.status_code == 304
+        assert cached_resp.text == ""
+        assert cached_resp.headers["ETag"] == etag
+
+    # Ensure clients with outdated SP metadata receive the current SP metadata
+    stale_resp = requests.get(
+        metadata_url, headers={"If-None-Match": '"stale"'}, verify=False, timeout=30
+    )
+    assert stale_resp.status_code == 200
+    assert stale_resp.text == metadata_resp.text
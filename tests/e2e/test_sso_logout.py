@@ -1,6 +1,13 @@
 """Tests for ensuring logouts end SSO sessions."""
 
+import base64
+import datetime
+import urllib.parse
+import uuid
+import zlib
+
 import pytest
+import requests
 from playwright.sync_api import Browser
 
 from tests.helpers.params import Params
@@ -58,3 +65,91 @@ def test_sso_logout_firefox(params: Params, firefox_browser: Browser) -> None:
     session = session_resp.json()
     assert "error" in session
     assert session_resp.status == 401
+
+
+@pytest.mark.usefixtures("saml2_config_default")
+def test_sso_logout_sls_advertised(params: Params) -> None:
+    """
+    Test that the SP metadata advertises the single logout service to the IdP
+    """
+    metadata_resp = requests.get(
+        f"{params.pfsense_url}/saml2_auth/sso/metadata/", verify=False, timeout=30
+    )
+    assert "SingleLogoutService" in metadata_resp.text
+    assert f'Location="{params.pfsense_url}/saml2_auth/sso/sls/"' in metadata_resp.text
+
+
+@pytest.mark.usefixtures("pfsense_user_group")
+@pytest.mark.usefixtures("saml2_config_default")
+def test_sso_logout_sls_rejects_invalid_request(
+    params: Params, chromium_browser: Browser
+) -> None:
+    """
+    Test that an invalid SAML2 logout request does not end the SSO session
+    """
+    page = chromium_browser.new_page()
+
+    # Navigate to the home page and initiate an SSO login
+    page.goto(f"{params.pfsense_url}/")
+    page.get_by_role("link", name="Sign In with SSO").click()
+    page.get_by_role("link", name="Dashboard").click()
+
+    # Send a logout request that was not issued by the IdP and ensure it is rejected
+    page.goto(f"{params.pfsense_url}/saml2_auth/sso/sls/?SAMLRequest=invalid")
+    assert page.url.startswith(f"{params.pfsense_url}/saml2_auth/sso/error/")
+
+    # Ensure we are still logged in
+    session_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/session/")
+    session = session_resp.json()
+    assert "error" not in session
+
+
+def get_logout_request(params: Params, name_id: str) -> str:
+    """
+    Builds a well-formed, unsigned SAML2 logout request for the NameID as issued by the configured IdP, encoded for
+    the HTTP-Redirect binding
+    """
+    issue_instant = datetime.datetime.now(datetime.timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+    xml = (
+        '<samlp:LogoutRequest xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol" '
+        'xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" '
+        f'ID="_{uuid.uuid4().hex}" Version="2.0" IssueInstant="{issue_instant}" '
+        f'Destination="{params.pfsense_url}/saml2_auth/sso/sls/">'
+        f"<saml:Issuer>{params.idp_entity_id}</saml:Issuer>"
+        f"<saml:NameID>{name_id}</saml:NameID>"
+        "</samlp:LogoutRequest>"
+    )
+    compressor = zlib.compressobj(wbits=-15)
+    deflated = compressor.compress(xml.encode()) + compressor.flush()
+    return base64.b64encode(deflated).decode()
+
+
+@pytest.mark.usefixtures("pfsense_user_group")
+@pytest.mark.usefixtures("saml2_config_default")
+def test_sso_logout_sls_rejects_unsigned_request(
+    params: Params, chromium_browser: Browser
+) -> None:
+    """
+    Test that a well-formed SAML2 logout request for the logged in NameID does not end the SSO session when it is not
+    signed by the IdP
+    """
+    page = chromium_browser.new_page()
+
+    # Navigate to the home page and initiate an SSO login
+    page.goto(f"{params.pfsense_url}/")
+    page.get_by_role("link", name="Sign In with SSO").click()
+    page.get_by_role("link", name="Dashboard").click()
+    session_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/session/")
+    name_id = session_resp.json()["saml2_name_id"]
+
+    # Send an unsigned logout request naming the IdP as issuer and ensure it is rejected
+    saml_request = urllib.parse.quote(get_logout_request(params, name_id), safe="")
+    page.goto(f"{params.pfsense_url}/saml2_auth/sso/sls/?SAMLRequest={saml_request}")
+    assert page.url.startswith(f"{params.pfsense_url}/saml2_auth/sso/error/")
+
+    # Ensure we are still logged in
+    session_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/session/")
+    session = session_resp.json()
+    assert "error" not in session
@@ -0,0 +1,68 @@
+"""Tests for ensuring SSO logins handle the responses of the mock IdP, including injected failures."""
+
+import pytest
+from playwright.sync_api import Browser
+
+from tests.helpers import mock_idp as mock
+from tests.helpers.mock_idp import MockIdP
+from tests.helpers.params import Params
+
+
+@pytest.mark.usefixtures("pfsense_user_group")
+@pytest.mark.usefixtures("saml2_config_mock_idp")
+def test_sso_mock_idp_login(
+    params: Params, mock_idp: MockIdP, chromium_browser: Browser
+) -> None:
+    """
+    Test that a response signed by the mock IdP logs in the NameID it was configured with, even when it is slow
+    """
+    mock_idp.configure(name_id=f"{params.idp_expected_nameid}-mock", latency=2)
+    page = chromium_browser.new_page()
+
+    # Navigate to the home page and initiate an SSO login
+    page.goto(f"{params.pfsense_url}/")
+    page.get_by_role("link", name="Sign In with SSO").click()
+    page.get_by_role("link", name="Dashboard").click()
+
+    # Ensure we have logged in as the configured NameID using the AuthnRequest sent by pfSense
+    session_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/session/")
+    session = session_resp.json()
+    assert "error" not in session
+    assert session["saml2_name_id"] == f"{params.idp_expected_nameid}-mock"
+    assert len(mock_idp.authn_requests) == 1
+    assert mock_idp.authn_requests[0]["acs_url"] == (
+        f"{params.pfsense_url}/saml2_auth/sso/acs/"
+    )
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        mock.FAILURE_STATUS,
+        mock.FAILURE_UNSIGNED,
+        mock.FAILURE_BAD_SIGNATURE,
+        mock.FAILURE_EXPIRED,
+        mock.FAILURE_AUDIENCE,
+    ],
+)
+@pytest.mark.usefixtures("pfsense_user_group")
+@pytest.mark.usefixtures("saml2_config_mock_idp")
+def test_sso_mock_idp_rejected_response(
+    params: Params, mock_idp: MockIdP, chromium_browser: Browser, failure: str
+) -> None:
+    """
+    Test that invalid responses from the IdP are rejected without establishing a session
+    """
+    mock_idp.configure(failure=failure)
+    page = chromium_browser.new_page()
+
+    # Navigate to the home page and initiate an SSO login
+    page.goto(f"{params.pfsense_url}/")
+    page.get_by_role("link", name="Sign In with SSO").click()
+    page.wait_for_url(f"{params.pfsense_url}/saml2_auth/sso/error/**")
+
+    # Ensure the rejected response did not establish a session
+    session_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/session/")
+    session = session_resp.json()
+    assert "error" in session
+    assert session_resp.status == 401
@@ -0,0 +1,63 @@
+"""Tests for the admission control of the unauthenticated SSO endpoints."""
+
+import pytest
+import requests
+
+from tests.helpers.params import Params
+from tests.helpers.pfsense_client import PfSenseClient
+from tests.helpers.saml2_config import Saml2Config
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def saml2_config_rate_limited(pfsense_client: PfSenseClient) -> Saml2Config:
+    """
+    Pytest fixture to configure SAML2 with a low per source rate limit.
+
+    Returns:
+        Saml2Config: Configuration object with a per source rate limit of 5 requests per minute
+    """
+    conf = Saml2Config(client=pfsense_client)
+    conf.rate_limit_per_source = 5
+    with pfsense_client.batch():
+        conf.save()
+        pfsense_client.run_command(
+            "rm -f /var/cache/pfSense-pkg-saml2-auth/rate_limits.bin"
+        )
+    yield conf
+
+    # After test, refill the buckets drained by the test. The next test sets the configuration it requires.
+    pfsense_client.run_command(
+        "rm -f /var/cache/pfSense-pkg-saml2-auth/rate_limits.bin"
+    )
+
+
+@pytest.mark.usefixtures("saml2_config_rate_limited")
+def test_sso_rate_limit(params: Params) -> None:
+    """
+    Test that requests over the per source rate limit are rejected with 429 before a session is started.
+    """
+    metadata_url = f"{params.pfsense_url}/saml2_auth/sso/metadata/"
+    responses = [
+        requests.get(metadata_url, verify=False, timeout=30) for _ in range(10)
+    ]
+
+    # Ensure the burst allowed by the bucket is admitted and the remaining requests are rejected
+    assert [resp.status_code for resp in responses[:5]] == [200] * 5
+    assert 429 in [resp.status_code for resp in responses[5:]]
+
+    # Ensure rejected requests tell the client when to retry and do not start a session
+    rejected_resp = next(resp for resp in responses if resp.status_code == 429)
+    assert int(rejected_resp.headers["Retry-After"]) >= 1
+    assert "Set-Cookie" not in rejected_resp.headers
+
+    # Ensure the ACS is limited by the same bucket
+    acs_resp = requests.post(
+        f"{params.pfsense_url}/saml2_auth/sso/acs/",
+        data={"SAMLResponse": "junk"},
+        verify=False,
+        allow_redirects=False,
+        timeout=30,
+    )
+    assert acs_resp.status_code == 429
@@ -0,0 +1,32 @@
+"""Tests for the SSO latency statistics endpoint."""
+
+import pytest
+from playwright.sync_api import Browser
+
+from tests.helpers.params import Params
+
+
+@pytest.mark.usefixtures("pfsense_user_group")
+@pytest.mark.usefixtures("saml2_config_default")
+def test_sso_stats_chromium(params: Params, chromium_browser: Browser) -> None:
+    """
+    Test that the phases of an SSO login are recorded and exposed to admins by the stats endpoint.
+    """
+    page = chromium_browser.new_page()
+
+    # Ensure the stats endpoint cannot be used without logging in
+    stats_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/stats/")
+    assert stats_resp.status == 401
+
+    # Navigate to the home page and initiate an SSO login
+    page.goto(f"{params.pfsense_url}/")
+    page.get_by_role("link", name="Sign In with SSO").click()
+    page.get_by_role("link", name="Dashboard").click()
+
+    # Ensure the phases of the SSO login were recorded
+    stats_resp = page.goto(f"{params.pfsense_url}/saml2_auth/sso/stats/")
+    stats = stats_resp.json()
+    assert stats_resp.status == 200
+    for phase in ("sso", "acs", "acs.process_response", "acs.privileges"):
+        assert stats[phase]["count"] >= 1
+        assert stats[phase]["p50_ms"] <= stats[phase]["p99_ms"]
@@ -0,0 +1,624 @@
+"""A mock SAML2 Identity Provider (IdP) that allows the e2e tests to run without an external IdP."""
+
+import base64
+import datetime
+import threading
+import time
+import uuid
+import zlib
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from lxml import etree
+from signxml import (
+    CanonicalizationMethod,
+    DigestAlgorithm,
+    SignatureMethod,
+    XMLSigner,
+)
+
+# XML namespaces used by SAML2 messages and metadata
+NS_SAMLP = "urn:oasis:names:tc:SAML:2.0:protocol"
+NS_SAML = "urn:oasis:names:tc:SAML:2.0:assertion"
+NS_MD = "urn:oasis:names:tc:SAML:2.0:metadata"
+NS_DS = "http://www.w3.org/2000/09/xmldsig#"
+
+# The failures the mock IdP can be told to inject into its responses
+FAILURE_HTTP_ERROR = "http_error"
+FAILURE_STATUS = "status"
+FAILURE_UNSIGNED = "unsigned"
+FAILURE_BAD_SIGNATURE = "bad_signature"
+FAILURE_EXPIRED = "expired"
+FAILURE_AUDIENCE = "audience"
+FAILURES = (
+    FAILURE_HTTP_ERROR,
+    FAILURE_STATUS,
+    FAILURE_UNSIGNED,
+    FAILURE_BAD_SIGNATURE,
+    FAILURE_EXPIRED,
+    FAILURE_AUDIENCE,
+)
+
+# The mock IdP shared by all tests of the test session, see start_mock_idp()
+_MOCK_IDP = None
+_MOCK_IDP_LOCK = threading.Lock()
+
+
+def _element(tag: str, attributes: dict = None, text: str = None, children=()):
+    """
+    Creates an XML element. Attributes with a value of None are omitted.
+
+    Args:
+        tag (str): The tag of the element in Clark notation, e.g. {namespace}name
+        attributes (dict): The attributes of the element
+        text (str): The text of the element
+        children (Iterable): The child elements of the element. None children are omitted.
+
+    Returns:
+        etree._Element: The created element
+    """
+    element = etree.Element(
+        tag,
+        {key: value for key, value in (attributes or {}).items() if value is not None},
+        nsmap={"samlp": NS_SAMLP, "saml": NS_SAML, "md": NS_MD, "ds": NS_DS},
+    )
+    element.text = text
+    element.extend(child for child in children if child is not None)
+    return element
+
+
+def _timestamp(delta: int = 0) -> str:
+    """
+    Formats the current time, shifted by a number of seconds, as a SAML2 timestamp.
+
+    Args:
+        delta (int): The number of seconds to shift the current time by
+
+    Returns:
+        str: The UTC timestamp in the format required by SAML2
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (now + datetime.timedelta(seconds=delta)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class MockIdP:
+    """
+    Defines a mock SAML2 IdP. The mock IdP serves its metadata, accepts AuthnRequests using the HTTP-Redirect binding
+    and answers them with a signed Response posted to the SP's ACS by the browser. It signs using a key pair generated
+    when it is created unless one is given, so it never needs network access beyond the SP.
+
+    Attributes:
+        host (str): The hostname or IP address the SP and browsers use to reach the mock IdP
+        port (int): The port the mock IdP listens on
+        url (str): The base URL of the mock IdP
+        entity_id (str): The entity ID of the mock IdP, which is also its metadata URL
+        metadata_url (str): The URL of the mock IdP's metadata
+        sso_url (str): The URL of the mock IdP's single sign-on service
+        x509_cert (str): The PEM encoded certificate the mock IdP signs responses with
+        default_name_id (str): The NameID used when no NameID is configured
+        default_groups (list[str]): The groups used when no groups are configured
+        groups_attribute (str): The attribute name containing the user's groups
+        name_id (str): The NameID of the user the mock IdP logs in
+        groups (list[str]): The groups of the user the mock IdP logs in
+        latency (float): The number of seconds the mock IdP waits before answering each request
+        failure (str|None): The failure to inject into the next responses, one of FAILURES
+        authn_requests (list[dict]): The AuthnRequests received by the mock IdP
+        server (ThreadingHTTPServer | None): The server serving requests, or None while the mock IdP is stopped
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments,too-many-positional-arguments
+
+    METADATA_PATH = "/metadata"
+    SSO_PATH = "/sso"
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 0,
+        name_id: str = "pfrest",
+        groups: list[str] = None,
+        groups_attribute: str = "groups",
+        key_pair: str = None,
+        serve: bool = True,
+    ) -> None:
+        """
+        Initializes the mock IdP and starts serving requests in a background thread
+
+        Args:
+            host (str): The hostname or IP address the SP and browsers use to reach the mock IdP
+            port (int): The port to listen on on all interfaces, or 0 to listen on any free port
+            name_id (str): The default NameID of the user the mock IdP logs in
+            groups (list[str]): The default groups of the user the mock IdP logs in
+            groups_attribute (str): The attribute name containing the user's groups
+            key_pair (str): The PEM encoded private key and certificate to sign with, see export_key_pair(). A new key
+                pair is generated if not given.
+            serve (bool): Start serving requests now. Only a fixed port can be reserved for serving requests later.
+        """
+        self.server = None
+        self.thread = None
+        self.host = host
+        self.port = port
+        if serve or not port:
+            self.start()
+        self.url = f"http://{self.host}:{self.port}"
+        self.metadata_url = f"{self.url}{self.METADATA_PATH}"
+        self.entity_id = self.metadata_url
+        self.sso_url = f"{self.url}{self.SSO_PATH}"
+        if key_pair:
+            self.key, self.cert = self.load_key_pair(key_pair)
+        else:
+            self.key, self.cert = self.generate_key_pair(self.entity_id)
+        self.x509_cert = self.cert.public_bytes(serialization.Encoding.PEM).decode()
+        self.default_name_id = name_id
+        self.default_groups = list(groups or [])
+        self.name_id = name_id
+        self.groups = list(self.default_groups)
+        self.latency = 0.0
+        self.failure = None
+        self.groups_attribute = groups_attribute
+        self.authn_requests = []
+        self.reset()
+
+    @staticmethod
+    def generate_key_pair(common_name: str) -> tuple:
+        """
+        Generates the RSA key and self-signed certificate the mock IdP signs responses with.
+
+        Args:
+            common_name (str): The common name of the certificate
+
+        Returns:
+            tuple: The private key and the certificate
+        """
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name[:64])])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            .sign(key, hashes.SHA256())
+        )
+        return key, cert
+
+    @staticmethod
+    def export_key_pair(key, cert) -> str:
+        """
+        Encodes a key pair so it can be passed to other processes, e.g. using an environment variable.
+
+        Args:
+            key (rsa.RSAPrivateKey): The private key
+            cert (x509.Certificate): The certificate
+
+        Returns:
+            str: The PEM encoded private key followed by the PEM encoded certificate
+        """
+        key_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        return (key_pem + cert.public_bytes(serialization.Encoding.PEM)).decode()
+
+    @staticmethod
+    def load_key_pair(key_pair: str) -> tuple:
+        """
+        Decodes a key pair encoded by export_key_pair().
+
+        Args:
+            key_pair (str): The PEM encoded private key followed by the PEM encoded certificate
+
+        Returns:
+            tuple: The private key and the certificate
+        """
+        key = serialization.load_pem_private_key(key_pair.encode(), password=None)
+        cert = x509.load_pem_x509_certificate(key_pair.encode())
+        return key, cert
+
+    def configure(
+        self,
+        name_id: str = None,
+        groups: list[str] = None,
+        latency: float = None,
+        failure: str = None,
+    ) -> None:
+        """
+        Changes how the mock IdP answers the next requests. Arguments that are None are left unchanged.
+
+        Args:
+            name_id (str): The NameID of the user the mock IdP logs in
+            groups (list[str]): The groups of the user the mock IdP logs in
+            latency (float): The number of seconds to wait before answering each request
+            failure (str): The failure to inject into the responses, one of FAILURES
+        """
+        if failure is not None and failure not in FAILURES:
+            raise ValueError(f"Unknown failure '{failure}', expected one of {FAILURES}")
+
+        self.name_id = self.name_id if name_id is None else name_id
+        self.groups = self.groups if groups is None else list(groups)
+        self.latency = self.latency if latency is None else latency
+        self.failure = self.failure if failure is None else failure
+
+    def reset(self) -> None:
+        """Restores the default behavior of the mock IdP and forgets the AuthnRequests it received"""
+        self.name_id = self.default_name_id
+        self.groups = list(self.default_groups)
+        self.latency = 0.0
+        self.failure = None
+        self.authn_requests.clear()
+
+    def start(self) -> None:
+        """Starts serving requests in a background thread, unless the mock IdP is already serving requests"""
+        if self.server is not None:
+            return
+
+        self.server = ThreadingHTTPServer(
+            ("0.0.0.0", self.port), _MockIdPRequestHandler
+        )
+        self.server.daemon_threads = True
+        self.server.idp = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops serving requests and releases the port, start() serves requests on the same port again"""
+        if self.server is None:
+            return
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.server = None
+        self.thread = None
+
+    def get_metadata(self) -> bytes:
+        """
+        Builds the metadata of the mock IdP.
+
+        Returns:
+            bytes: The metadata XML
+        """
+        cert_der = self.cert.public_bytes(serialization.Encoding.DER)
+        metadata = _element(
+            f"{{{NS_MD}}}EntityDescriptor",
+            {"entityID": self.entity_id},
+            children=[
+                _element(
+                    f"{{{NS_MD}}}IDPSSODescriptor",
+                    {
+                        "protocolSupportEnumeration": NS_SAMLP,
+                        "WantAuthnRequestsSigned": "false",
+                    },
+                    children=[
+                        _element(
+                            f"{{{NS_MD}}}KeyDescriptor",
+                            {"use": "signing"},
+                            children=[
+                                _element(
+                                    f"{{{NS_DS}}}KeyInfo",
+                                    children=[
+                                        _element(
+                                            f"{{{NS_DS}}}X509Data",
+                                            children=[
+                                                _element(
+                                                    f"{{{NS_DS}}}X509Certificate",
+                                                    text=base64.b64encode(
+                                                        cert_der
+                                                    ).decode(),
+                                                )
+                                            ],
+                                        )
+                                    ],
+                                )
+                            ],
+                        ),
+                        _element(
+                            f"{{{NS_MD}}}NameIDFormat",
+                            text="urn:oasis:names:tc:SAML:1.1:nameid-format:unspecified",
+                        ),
+                        _element(
+                            f"{{{NS_MD}}}SingleSignOnService",
+                            {
+                                "Binding": "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Redirect",
+                                "Location": self.sso_url,
+                            },
+                        ),
+                    ],
+                )
+            ],
+        )
+        etree.cleanup_namespaces(metadata)
+        return etree.tostring(metadata, xml_declaration=True, encoding="UTF-8")
+
+    @staticmethod
+    def parse_authn_request(saml_request: str) -> dict:
+        """
+        Decodes an AuthnRequest sent using the HTTP-Redirect binding.
+
+        Args:
+            saml_request (str): The SAMLRequest query parameter
+
+        Returns:
+            dict: The 'id', 'issuer' and 'acs_url' of the AuthnRequest
+        """
+        xml = zlib.decompress(base64.b64decode(saml_request), -zlib.MAX_WBITS)
+        request = etree.fromstring(xml, parser=etree.XMLParser(resolve_entities=False))
+        return {
+            "id": request.get("ID"),
+            "issuer": request.findtext(f"{{{NS_SAML}}}Issuer"),
+            "acs_url": request.get("AssertionConsumerServiceURL"),
+        }
+
+    def get_response(self, authn_request: dict) -> bytes:
+        """
+        Builds the Response to an AuthnRequest, injecting the configured failure if any.
+
+        Args:
+            authn_request (dict): The AuthnRequest as returned by parse_authn_request()
+
+        Returns:
+            bytes: The Response XML
+        """
+        assertion_id = f"_{uuid.uuid4().hex}"
+        acs_url = authn_request["acs_url"]
+        audience = authn_request["issuer"]
+        not_on_or_after = _timestamp(300)
+        if self.failure == FAILURE_EXPIRED:
+            not_on_or_after = _timestamp(-3600)
+        if self.failure == FAILURE_AUDIENCE:
+            audience = "https://unknown.example.com/"
+
+        status_code = "urn:oasis:names:tc:SAML:2.0:status:Success"
+        if self.failure == FAILURE_STATUS:
+            status_code = "urn:oasis:names:tc:SAML:2.0:status:Responder"
+
+        assertion = _element(
+            f"{{{NS_SAML}}}Assertion",
+            {"ID": assertion_id, "Version": "2.0", "IssueInstant": _timestamp()},
+            children=[
+                _element(f"{{{NS_SAML}}}Issuer", text=self.entity_id),
+                # Tells signxml where to place the signature, SAML2 requires it to follow the Issuer
+                _element(f"{{{NS_DS}}}Signature", {"Id": "placeholder"}),
+                _element(
+                    f"{{{NS_SAML}}}Subject",
+                    children=[
+                        _element(
+                            f"{{{NS_SAML}}}NameID",
+                            {
+                                "Format": "urn:oasis:names:tc:SAML:1.1:nameid-format:unspecified"
+                            },
+                            text=self.name_id,
+                        ),
+                        _element(
+                            f"{{{NS_SAML}}}SubjectConfirmation",
+                            {"Method": "urn:oasis:names:tc:SAML:2.0:cm:bearer"},
+                            children=[
+                                _element(
+                                    f"{{{NS_SAML}}}SubjectConfirmationData",
+                                    {
+                                        "NotOnOrAfter": not_on_or_after,
+                                        "Recipient": acs_url,
+                                        "InResponseTo": authn_request["id"],
+                                    },
+                                )
+                            ],
+                        ),
+                    ],
+                ),
+                _element(
+                    f"{{{NS_SAML}}}Conditions",
+                    {"NotBefore": _timestamp(-60), "NotOnOrAfter": not_on_or_after},
+                    children=[
+                        _element(
+                            f"{{{NS_SAML}}}AudienceRestriction",
+                            children=[
+                                _element(f"{{{NS_SAML}}}Audience", text=audience)
+                            ],
+                        )
+                    ],
+                ),
+                _element(
+                    f"{{{NS_SAML}}}AuthnStatement",
+                    {
+                        "AuthnInstant": _timestamp(),
+                        "SessionIndex": f"_{uuid.uuid4().hex}",
+                    },
+                    children=[
+                        _element(
+                            f"{{{NS_SAML}}}AuthnContext",
+                            children=[
+                                _element(
+                                    f"{{{NS_SAML}}}AuthnContextClassRef",
+                                    text="urn:oasis:names:tc:SAML:2.0:ac:classes:PasswordProtectedTransport",
+                                )
+                            ],
+                        )
+                    ],
+                ),
+                self.get_attribute_statement(),
+            ],
+        )
+
+        if self.failure == FAILURE_UNSIGNED:
+            assertion.remove(assertion.find(f"{{{NS_DS}}}Signature"))
+        else:
+            signer = XMLSigner(
+                signature_algorithm=SignatureMethod.RSA_SHA256,
+                digest_algorithm=DigestAlgorithm.SHA256,
+                c14n_algorithm=CanonicalizationMethod.EXCLUSIVE_XML_CANONICALIZATION_1_0,
+            )
+            assertion = signer.sign(
+                assertion, key=self.key, cert=[self.cert], reference_uri=assertion_id
+            )
+
+        # Alter the signed assertion so its digest no longer matches
+        if self.failure == FAILURE_BAD_SIGNATURE:
+            assertion.find(f".//{{{NS_SAML}}}NameID").text += "-tampered"
+
+        response = _element(
+            f"{{{NS_SAMLP}}}Response",
+            {
+                "ID": f"_{uuid.uuid4().hex}",
+                "Version": "2.0",
+                "IssueInstant": _timestamp(),
+                "Destination": acs_url,
+                "InResponseTo": authn_request["id"],
+            },
+            children=[
+                _element(f"{{{NS_SAML}}}Issuer", text=self.entity_id),
+                _element(
+                    f"{{{NS_SAMLP}}}Status",
+                    children=[
+                        _element(f"{{{NS_SAMLP}}}StatusCode", {"Value": status_code})
+                    ],
+                ),
+                None if self.failure == FAILURE_STATUS else assertion,
+            ],
+        )
+        etree.cleanup_namespaces(response)
+        return etree.tostring(response, xml_declaration=True, encoding="UTF-8")
+
+    def get_attribute_statement(self):
+        """
+        Builds the AttributeStatement containing the user's groups.
+
+        Returns:
+            etree._Element|None: The AttributeStatement, or None if no groups attribute is configured
+        """
+        if not self.groups_attribute:
+            return None
+
+        return _element(
+            f"{{{NS_SAML}}}AttributeStatement",
+            children=[
+                _element(
+                    f"{{{NS_SAML}}}Attribute",
+                    {
+                        "Name": self.groups_attribute,
+                        "NameFormat": "urn:oasis:names:tc:SAML:2.0:attrname-format:basic",
+                    },
+                    children=[
+                        _element(f"{{{NS_SAML}}}AttributeValue", text=group)
+                        for group in self.groups
+                    ],
+                )
+            ],
+        )
+
+    def get_post_form(self, acs_url: str, response: bytes, relay_state: str) -> bytes:
+        """
+        Builds the page that posts a Response to the SP's ACS using the HTTP-POST binding.
+
+        Args:
+            acs_url (str): The URL of the SP's ACS
+            response (bytes): The Response XML
+            relay_state (str): The RelayState received with the AuthnRequest, if any
+
+        Returns:
+            bytes: The HTML page, which submits itself when loaded
+        """
+        relay_state_input = ""
+        if relay_state:
+            relay_state_input = f'<input type="hidden" name="RelayState" value="{escape(relay_state)}"/>'
+
+        return (
+            '<!DOCTYPE html><html><body onload="document.forms[0].submit()">'
+            f'<form method="post" action="{escape(acs_url)}">'
+            f'<input type="hidden" name="SAMLResponse" value="{base64.b64encode(response).decode()}"/>'
+            f"{relay_state_input}"
+            '<noscript><input type="submit" value="Continue"/></noscript>'
+            "</form></body></html>"
+        ).encode()
+
+
+class _MockIdPRequestHandler(BaseHTTPRequestHandler):
+    """Handles the HTTP requests sent to the mock IdP"""
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serves the metadata and the single sign-on service"""
+        idp = self.server.idp
+        url = urlparse(self.path)
+        time.sleep(idp.latency)
+
+        if url.path == MockIdP.METADATA_PATH:
+            self.send_body(200, idp.get_metadata(), "application/samlmetadata+xml")
+            return
+        if url.path != MockIdP.SSO_PATH:
+            self.send_body(404, b"Not Found", "text/plain")
+            return
+        if idp.failure == FAILURE_HTTP_ERROR:
+            self.send_body(500, b"Internal Server Error", "text/plain")
+            return
+
+        query = parse_qs(url.query)
+        try:
+            authn_request = idp.parse_authn_request(query["SAMLRequest"][0])
+        except (KeyError, ValueError, zlib.error, etree.XMLSyntaxError):
+            self.send_body(400, b"Invalid SAMLRequest", "text/plain")
+            return
+
+        idp.authn_requests.append(authn_request)
+        response = idp.get_response(authn_request)
+        relay_state = query.get("RelayState", [""])[0]
+        form = idp.get_post_form(authn_request["acs_url"], response, relay_state)
+        self.send_body(200, form, "text/html")
+
+    def send_body(self, status: int, body: bytes, content_type: str) -> None:
+        """
+        Sends a complete response.
+
+        Args:
+            status (int): The HTTP status code
+            body (bytes): The response body
+            content_type (str): The content type of the response body
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(  # pylint: disable=redefined-builtin
+        self, format: str, *args
+    ) -> None:
+        """Silences the access log, pytest captures stderr"""
+
+
+def start_mock_idp(host: str, port: int = 0, **kwargs) -> MockIdP:
+    """
+    Starts the mock IdP shared by all tests of the test session, or returns it if it is already running. The mock IdP
+    must be shared since its certificate is configured in pfSense.
+
+    Args:
+        host (str): The hostname or IP address the SP and browsers use to reach the mock IdP
+        port (int): The port to listen on on all interfaces, or 0 to listen on any free port
+        **kwargs: The remaining arguments of MockIdP
+
+    Returns:
+        MockIdP: The running mock IdP
+    """
+    global _MOCK_IDP  # pylint: disable=global-statement
+    with _MOCK_IDP_LOCK:
+        if _MOCK_IDP is None:
+            _MOCK_IDP = MockIdP(host, port, **kwargs)
+        return _MOCK_IDP
+
+
+def get_mock_idp():
+    """
+    Obtains the mock IdP shared by all tests of the test session, if it was started.
+
+    Returns:
+        MockIdP | None: The mock IdP, or None if it was not started
+    """
+    return _MOCK_IDP
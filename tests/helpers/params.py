@@ -1,21 +1,43 @@
 """Parameters used to describe the pfSense and IdP test environment."""
 
 import os
+import socket
 
 import requests
 
+from tests.helpers.mock_idp import MockIdP, start_mock_idp
+
+MOCK_KEY_PAIR = "PFSENSE_PKG_SAML2_AUTH_IDP_MOCK_KEY_PAIR"
+MOCK_PORTS = "PFSENSE_PKG_SAML2_AUTH_IDP_MOCK_PORTS"
+
+
+def _is_idp_mock() -> bool:
+    """Checks if the tests run against the mock IdP instead of an external IdP"""
+    return os.environ.get("PFSENSE_PKG_SAML2_AUTH_IDP_MOCK", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+
 
 class Params:
     """
     A class to hold parameters used to describe the pfSense and IdP test environment.
 
     Attributes:
-        pfsense_host (str): The hostname or IP address of the pfSense instance to test against.
+        worker (str): The ID of the pytest-xdist worker running the tests (e.g. `gw0`), or an empty string when the
+            tests are not run in parallel.
+        worker_index (int): The index of the pytest-xdist worker running the tests, 0 when not run in parallel.
+        pfsense_hosts (list[str]): The hostnames or IP addresses of all pfSense instances the tests are spread across.
+        pfsense_host_index (int): The index of the pfSense instance to test against in pfsense_hosts.
+        pfsense_host (str): The hostname or IP address of the pfSense instance to test against. When multiple pfSense
+            instances are given, each worker tests against one of them.
         pfsense_username (str): The username for authentication with the pfSense instance.
         pfsense_password (str): The password for authentication with the pfSense instance.
         pfsense_port (int): The port number for the pfSense instance.
         pfsense_scheme (str): The URL scheme (http or https) for the pfSense instance.
         pfsense_url (str): The complete base URL for the pfSense instance.
+        idp_mock (bool): Whether to test against the mock IdP started by the tests instead of an external IdP.
         idp_host (str): The hostname or IP address of the IdP instance to test against.
         idp_port (int): The port number for the IdP instance.
         idp_scheme (str): The URL scheme (http or https) for the IdP instance.
@@ -25,14 +47,23 @@ class Params:
         idp_sign_on_url (str): The sign-on URL for the IdP.
         idp_groups_attribute (str): The attribute name for user groups in the IdP.
         idp_x509_cert (str): The x509 certificate data for the IdP.
-        idp_expected_nameid (str): The expected NameID value in SAML assertions from the IdP.
-        idp_expected_group (list[str]): A list of expected user groups in SAML assertions from the IdP.
+        idp_expected_nameid (str): The expected NameID value in SAML assertions from the IdP. When testing against
+            the mock IdP in parallel, the NameID is unique to each worker.
+        idp_expected_group (list[str]): A list of expected user groups in SAML assertions from the IdP. When testing
+            against the mock IdP in parallel, the group is unique to each worker.
     """
 
     # pylint: disable=too-many-instance-attributes,too-few-public-methods
 
     def __init__(self) -> None:
-        self.pfsense_host = os.environ["PFSENSE_PKG_SAML2_AUTH_PFSENSE_HOST"]
+        self.worker = os.environ.get("PYTEST_XDIST_WORKER", "")
+        self.worker_index = int(self.worker.removeprefix("gw") or 0)
+        self.pfsense_hosts = (
+            os.environ.get("PFSENSE_PKG_SAML2_AUTH_PFSENSE_HOSTS")
+            or os.environ["PFSENSE_PKG_SAML2_AUTH_PFSENSE_HOST"]
+        ).split(",")
+        self.pfsense_host_index = self.worker_index % len(self.pfsense_hosts)
+        self.pfsense_host = self.pfsense_hosts[self.pfsense_host_index].strip()
         self.pfsense_username = os.environ.get(
             "PFSENSE_PKG_SAML2_AUTH_PFSENSE_USERNAME", "admin"
         )
@@ -44,7 +75,49 @@ class Params:
             "PFSENSE_PKG_SAML2_AUTH_PFSENSE_SCHEME", "https"
         )
         self.pfsense_url = f"{self.pfsense_scheme}://{self.pfsense_host}"
+        self.idp_mock = _is_idp_mock()
         self.idp_host = os.environ["PFSENSE_PKG_SAML2_AUTH_IDP_HOST"]
+        self.idp_groups_attribute = os.environ.get(
+            "PFSENSE_PKG_SAML2_AUTH_IDP_GROUPS_ATTRIBUTE",
+            "groups" if self.idp_mock else None,
+        )
+        self.idp_expected_nameid = os.environ.get(
+            "PFSENSE_PKG_SAML2_AUTH_IDP_EXPECTED_NAMEID",
+            "pfrest" if self.idp_mock else None,
+        )
+        self.idp_expected_group = os.environ.get(
+            "PFSENSE_PKG_SAML2_AUTH_IDP_EXPECTED_GROUP",
+            "staff" if self.idp_mock else "",
+        )
+
+        # When testing against the mock IdP, describe the mock IdP instead of reading the IdP from the environment
+        if self.idp_mock:
+            # Each worker runs its own mock IdP, logging in its own user so workers never use each other's users
+            if self.worker:
+                self.idp_expected_nameid = f"{self.idp_expected_nameid}-{self.worker}"
+                if self.idp_expected_group:
+                    self.idp_expected_group = f"{self.idp_expected_group}-{self.worker}"
+
+            # Workers testing against the same pfSense instance share the port and key pair of their mock IdPs, so
+            # they share the same SAML2 configuration. They take turns serving the port while they hold the instance.
+            mock_idp = start_mock_idp(
+                host=self.idp_host,
+                port=self.get_mock_idp_port(),
+                name_id=self.idp_expected_nameid,
+                groups=[self.idp_expected_group] if self.idp_expected_group else [],
+                groups_attribute=self.idp_groups_attribute,
+                key_pair=os.environ.get(MOCK_KEY_PAIR),
+                serve=not self.worker,
+            )
+            self.idp_port = mock_idp.port
+            self.idp_scheme = "http"
+            self.idp_url = mock_idp.url
+            self.idp_metadata_url = mock_idp.metadata_url
+            self.idp_entity_id = mock_idp.entity_id
+            self.idp_sign_on_url = mock_idp.SSO_PATH
+            self.idp_x509_cert = mock_idp.x509_cert
+            return
+
         self.idp_port = os.environ.get("PFSENSE_PKG_SAML2_AUTH_IDP_PORT", 8443)
         self.idp_scheme = os.environ.get("PFSENSE_PKG_SAML2_AUTH_IDP_SCHEME", "https")
         self.idp_url = f"{self.idp_scheme}://{self.idp_host}:{self.idp_port}"
@@ -53,16 +126,52 @@ class Params:
         )
         self.idp_entity_id = os.environ["PFSENSE_PKG_SAML2_AUTH_IDP_ENTITY_ID"]
         self.idp_sign_on_url = os.environ["PFSENSE_PKG_SAML2_AUTH_IDP_SIGN_ON_URL"]
-        self.idp_groups_attribute = os.environ.get(
-            "PFSENSE_PKG_SAML2_AUTH_IDP_GROUPS_ATTRIBUTE"
-        )
         self.idp_x509_cert = self.fetch_cert_from_idp()
-        self.idp_expected_nameid = os.environ.get(
-            "PFSENSE_PKG_SAML2_AUTH_IDP_EXPECTED_NAMEID"
-        )
-        self.idp_expected_group = os.environ.get(
-            "PFSENSE_PKG_SAML2_AUTH_IDP_EXPECTED_GROUP", ""
+
+    def get_mock_idp_port(self) -> int:
+        """
+        Obtains the port the mock IdP listens on. The mock IdPs of all workers testing against the same pfSense instance
+        listen on the same port.
+
+        Returns:
+            int: The port to listen on, or 0 to listen on any free port
+        """
+        if os.environ.get(MOCK_PORTS):
+            return int(os.environ[MOCK_PORTS].split(",")[self.pfsense_host_index])
+
+        port = int(os.environ.get("PFSENSE_PKG_SAML2_AUTH_IDP_PORT", 0))
+        return port + self.pfsense_host_index if port else 0
+
+    @staticmethod
+    def share_mock_idp() -> None:
+        """
+        Prepares the mock IdPs of the pytest-xdist workers, this must be called by the controller before the workers
+        are started. Generates the key pair shared by the mock IdPs of all workers and, unless a port is configured,
+        picks a free port for the mock IdPs of each pfSense instance. These are passed to the workers using environment
+        variables.
+        """
+        if not _is_idp_mock():
+            return
+
+        if not os.environ.get(MOCK_KEY_PAIR):
+            os.environ[MOCK_KEY_PAIR] = MockIdP.export_key_pair(
+                *MockIdP.generate_key_pair("pfSense-pkg-saml2-auth mock IdP")
+            )
+
+        if os.environ.get(MOCK_PORTS) or os.environ.get(
+            "PFSENSE_PKG_SAML2_AUTH_IDP_PORT"
+        ):
+            return
+        hosts = (
+            os.environ.get("PFSENSE_PKG_SAML2_AUTH_PFSENSE_HOSTS")
+            or os.environ["PFSENSE_PKG_SAML2_AUTH_PFSENSE_HOST"]
+        ).split(",")
+        sockets = [socket.create_server(("0.0.0.0", 0)) for _ in hosts]
+        os.environ[MOCK_PORTS] = ",".join(
+            str(sock.getsockname()[1]) for sock in sockets
         )
+        for sock in sockets:
+            sock.close()
 
     def fetch_cert_from_idp(self) -> str:
         """
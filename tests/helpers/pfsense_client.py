@@ -1,16 +1,68 @@
 """Module containing a helper client class to interact with pfSense instances"""
 
+import contextlib
+import hashlib
 import json
+import threading
+import uuid
+from typing import Iterator, Optional
 
 import pfsense_vshell
 import requests
 
 from tests.helpers.params import Params
 
+_PFSENSE_CLIENT = None
+_PFSENSE_CLIENT_LOCK = threading.Lock()
+
+
+class _KeepAliveSession(requests.Session):
+    """
+    Defines a requests session that keeps its connections open. pfsense_vshell closes its session after each request,
+    which would otherwise require a new TCP connection and TLS handshake for every request.
+    """
+
+    def close(self) -> None:
+        """Keeps the pooled connections open, use close_connections() to close them"""
+
+    def close_connections(self) -> None:
+        """Closes the pooled connections"""
+        super().close()
+
+
+class _PooledPFClient(pfsense_vshell.PFClient):
+    """
+    Defines a pfsense_vshell client that reuses its authenticated GUI session. pfsense_vshell checks the host and
+    authenticates again before each command, this client only does so before the first command and when the GUI
+    session has expired.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.session = _KeepAliveSession()
+        self.authenticated = False
+
+    def __has_host_errors__(self) -> bool:
+        """Checks the host and authenticates only if the GUI session has not been authenticated yet"""
+        if not self.authenticated:
+            super().__has_host_errors__()
+            self.authenticated = True
+        return False
+
+    def run_command(self, cmd: str) -> Optional[str]:
+        """Executes a shell command, authenticating again and retrying once if the GUI session has expired"""
+        output = super().run_command(cmd)
+        if output is None and "usernamefld" in self.last_request.text:
+            self.authenticated = False
+            output = super().run_command(cmd)
+        return output
+
 
 class PfSenseClient:
     """
-    Defines a helper client class to configure and interact with the target pfSense instance
+    Defines a helper client class to configure and interact with the target pfSense instance. The client keeps one
+    authenticated GUI session for shell commands and one keep-alive session for REST API requests, use
+    get_pfsense_client() to share a single client between all tests.
 
     Attributes:
         host (str): The hostname or IP address of the pfSense instance
@@ -20,8 +72,13 @@ class PfSenseClient:
         scheme (str): The URL scheme (http or https)
         url (str): The base URL for the pfSense instance
         client (pfsense_vshell.PFClient): An instance of PFClient for executing commands on pfSense
+        session (requests.Session): The keep-alive session used for pfSense REST API requests
+        pending_commands (list[str] | None): The commands deferred by batch(), or None when not batching
+        saml2_config_hash (str | None): The hash of the SAML2 configuration last set on pfSense, or None if unknown
     """
 
+    # pylint: disable=too-many-instance-attributes
+
     def __init__(self) -> None:
         """Initializes the PfSenseClient with parameters from environment variables"""
         # Load test parameters from environment variables
@@ -34,7 +91,7 @@ class PfSenseClient:
         self.port = params.pfsense_port
         self.scheme = params.pfsense_scheme
         self.url = params.pfsense_url
-        self.client = pfsense_vshell.PFClient(
+        self.client = _PooledPFClient(
             host=self.host,
             username=self.username,
             password=self.password,
@@ -42,31 +99,99 @@ class PfSenseClient:
             scheme=self.scheme,
             verify=False,
         )
+        self.session = requests.Session()
+        self.session.auth = (self.username, self.password)
+        self.session.verify = False
+        self.session.headers.update({"Accept": "application/json"})
+        self.pending_commands = None
+        self.saml2_config_hash = None
+
+    def close(self) -> None:
+        """Closes the pooled connections of the client"""
+        self.client.session.close_connections()
+        self.session.close()
 
     def set_saml2_config(self, config: dict) -> None:
         """
-        Sets the SAML2 configuration in pfSense using the provided config dictionary
+        Sets the SAML2 configuration in pfSense using the provided config dictionary. Nothing is sent to pfSense if the
+        configuration is already set, so tests requiring the same configuration only set it once.
 
         Args:
             config (dict): A dictionary containing SAML2 configuration parameters
         """
-        self.client.run_command(
-            f"echo '{json.dumps(config)}' > /var/cache/pfSense-pkg-saml2-auth/backup.json && "
+        config_json = json.dumps(config)
+        config_hash = hashlib.sha256(config_json.encode()).hexdigest()
+        if config_hash == self.saml2_config_hash:
+            return
+
+        self.run_command(
+            f"echo '{config_json}' > /var/cache/pfSense-pkg-saml2-auth/backup.json && "
             "pfsense-saml2 restore"
         )
+        self.saml2_config_hash = config_hash
 
-    def run_command(self, command: str) -> str:
+    def run_command(self, command: str) -> Optional[str]:
         """
-        Executes a command on the pfSense instance and returns the output
+        Executes a command on the pfSense instance and returns the output. Within batch(), the command is deferred until
+        the batch ends instead.
 
         Args:
             command (str): The command to execute
 
         Returns:
-            str: The output of the command
+            str | None: The output of the command, or None if the command was deferred by batch()
         """
+        if self.pending_commands is not None:
+            self.pending_commands.append(command)
+            return None
+
         return self.client.run_command(command)
 
+    def run_commands(self, commands: list[str]) -> list[str]:
+        """
+        Executes multiple commands on the pfSense instance in a single round trip. Each command is run even if a
+        previous command failed.
+
+        Args:
+            commands (list[str]): The commands to execute, in order
+
+        Returns:
+            list[str]: The output of each command
+        """
+        if not commands:
+            return []
+
+        # Separate the output of the commands using a marker that cannot appear in their output
+        marker = f"--- pfsense-client {uuid.uuid4()} ---"
+        output = self.client.run_command(f"; echo '{marker}'; ".join(commands))
+        outputs = (output or "").split(f"{marker}\n")
+        if len(outputs) != len(commands):
+            raise SystemError(f"Failed to run batched commands: {output}")
+
+        return outputs
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Defers the commands run within the context, including SAML2 configuration saves, and runs them in a single
+        round trip when the context exits. The deferred commands are discarded if the context raises an exception.
+        Nested batches are run by the outermost batch.
+        """
+        if self.pending_commands is not None:
+            yield
+            return
+
+        self.pending_commands = []
+        try:
+            yield
+            commands, self.pending_commands = self.pending_commands, None
+            self.run_commands(commands)
+        except BaseException:
+            # The deferred commands may have included a SAML2 configuration that was never set
+            self.pending_commands = None
+            self.saml2_config_hash = None
+            raise
+
     def add_user(self, username: str, password: str, privileges: list[str]) -> dict:
         """
         Creates a user in pfSense with the specified username, password, and privileges
@@ -79,11 +204,8 @@ class PfSenseClient:
         Returns:
             dict: The JSON response from the pfSense REST API containing user details
         """
-        user_post = requests.post(
+        user_post = self.session.post(
             url=f"{self.scheme}://{self.host}:{self.port}/api/v2/user",
-            auth=(self.username, self.password),
-            headers={"Content-Type": "application/json", "Accept": "application/json"},
-            verify=False,
             timeout=30,
             json={"name": username, "password": password, "priv": privileges},
         )
@@ -103,15 +225,10 @@ class PfSenseClient:
         Returns:
             dict: The JSON response from the pfSense REST API confirming deletion
         """
-        user_delete = requests.delete(
+        user_delete = self.session.delete(
             url=f"{self.scheme}://{self.host}:{self.port}/api/v2/user?id={user_id}",
-            auth=(self.username, self.password),
-            verify=False,
             timeout=30,
-            headers={
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Accept": "application/json",
-            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
         )
 
         if user_delete.status_code != 200:
@@ -130,11 +247,8 @@ class PfSenseClient:
         Returns:
             dict: The JSON response from the pfSense REST API containing group details
         """
-        group_post = requests.post(
+        group_post = self.session.post(
             url=f"{self.scheme}://{self.host}:{self.port}/api/v2/user/group",
-            auth=(self.username, self.password),
-            headers={"Content-Type": "application/json", "Accept": "application/json"},
-            verify=False,
             timeout=30,
             json={"name": name, "priv": privileges},
         )
@@ -154,18 +268,28 @@ class PfSenseClient:
         Returns:
             dict: The JSON response from the pfSense REST API confirming deletion
         """
-        group_delete = requests.delete(
+        group_delete = self.session.delete(
             url=f"{self.scheme}://{self.host}:{self.port}/api/v2/user/group?id={group_id}",
-            auth=(self.username, self.password),
-            verify=False,
             timeout=30,
-            headers={
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Accept": "application/json",
-            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
         )
 
         if group_delete.status_code != 200:
             raise SystemError(f"Failed to delete group {group_id}: {group_delete.text}")
 
         return group_delete.json()
+
+
+def get_pfsense_client() -> PfSenseClient:
+    """
+    Obtains the PfSenseClient shared by all tests of the test session, creating it on first use. Sharing the client
+    keeps its authenticated GUI session and its pooled connections for the whole test session.
+
+    Returns:
+        PfSenseClient: The shared client
+    """
+    global _PFSENSE_CLIENT  # pylint: disable=global-statement
+    with _PFSENSE_CLIENT_LOCK:
+        if _PFSENSE_CLIENT is None:
+            _PFSENSE_CLIENT = PfSenseClient()
+        return _PFSENSE_CLIENT
@@ -1,10 +1,10 @@
 """Helper class for managing SAML2 configuration in pfSense."""
 
 import base64
-import json
+from typing import Optional
 
 from tests.helpers.params import Params
-from tests.helpers.pfsense_client import PfSenseClient
+from tests.helpers.pfsense_client import PfSenseClient, get_pfsense_client
 
 
 class Saml2Config:
@@ -18,12 +18,16 @@ class Saml2Config:
     idp_entity_id: str
     idp_sign_on_url: str
     idp_groups_attribute: str
+    session_attributes: str
     idp_x509_cert: str
     sp_base_url: str
+    acs_max_response_size: int
+    rate_limit_per_source: int
+    rate_limit_global: int
     custom_conf: str
 
-    def __init__(self, **kwargs) -> None:
-        self.client = PfSenseClient()
+    def __init__(self, client: Optional[PfSenseClient] = None, **kwargs) -> None:
+        self.client = client or get_pfsense_client()
         self.params = Params()
         self.enable = kwargs.get("enable", True)
         self.strip_username = kwargs.get("strip_username", True)
@@ -38,26 +42,31 @@ class Saml2Config:
         self.idp_groups_attribute = kwargs.get(
             "idp_groups_attribute", self.params.idp_groups_attribute
         )
+        self.session_attributes = kwargs.get("session_attributes", "")
         self.idp_x509_cert = kwargs.get("idp_x509_cert", self.params.idp_x509_cert)
         self.idp_verify_cert = kwargs.get("idp_verify_cert", False)
         self.sp_base_url = kwargs.get("sp_base_url", self.params.pfsense_url)
+        self.acs_max_response_size = kwargs.get("acs_max_response_size", 256)
+        self.rate_limit_per_source = kwargs.get("rate_limit_per_source", 60)
+        self.rate_limit_global = kwargs.get("rate_limit_global", 600)
         self.custom_conf = kwargs.get("custom_conf", "")
 
     def save(self):
         """
-        Saves the SAML2 configuration on pfSense by overwriting the backup file and restoring it.
+        Saves the SAML2 configuration on pfSense by overwriting the backup file and restoring it. Within
+        PfSenseClient.batch(), the configuration is saved when the batch ends.
         """
-        config = self.to_pfsense_config()
-        config_json = json.dumps(config)
-        backup_file = "/var/cache/pfSense-pkg-saml2-auth/backup.json"
-        cmd = f"echo '{config_json}' > {backup_file} && pfsense-saml2 restore"
-        self.client.run_command(cmd)
+        self.client.set_saml2_config(self.to_pfsense_config())
 
     @staticmethod
     def to_pfsense_bool(value: bool) -> str:
         """Converts a boolean value to pfSense's expected string format."""
         return "yes" if value else ""
 
+    def to_idp_url(self, url: str) -> str:
+        """Converts a path on the test IdP to a URL, URLs of other IdPs are left unchanged."""
+        return f"{self.params.idp_url}{url}" if url.startswith("/") else url
+
     def to_pfsense_config(self) -> dict:
         """Converts the SAML2 configuration to a dictionary format suitable for pfSense."""
         return {
@@ -66,9 +75,13 @@ class Saml2Config:
             "debug_mode": self.to_pfsense_bool(self.debug_mode),
             "idp_metadata_url": self.idp_metadata_url,
             "idp_entity_id": self.idp_entity_id,
-            "idp_sign_on_url": f"{self.params.idp_url}{self.idp_sign_on_url}",
+            "idp_sign_on_url": self.to_idp_url(self.idp_sign_on_url),
             "idp_groups_attribute": self.idp_groups_attribute,
+            "session_attributes": self.session_attributes,
             "idp_x509_cert": base64.b64encode(self.idp_x509_cert.encode()).decode(),
             "sp_base_url": self.sp_base_url,
+            "acs_max_response_size": str(self.acs_max_response_size),
+            "rate_limit_per_source": str(self.rate_limit_per_source),
+            "rate_limit_global": str(self.rate_limit_global),
             "custom_conf": base64.b64encode(self.custom_conf.encode()).decode(),
         }
@@ -0,0 +1,51 @@
+"""Module containing a lock that gives a test exclusive use of a pfSense instance shared by parallel test workers"""
+
+import fcntl
+import json
+import os
+import pathlib
+
+
+class TargetLock:
+    """
+    Defines an exclusive lock on a pfSense instance shared by the workers of a parallel test run. The SAML2
+    configuration of pfSense is global, so only one test can use a pfSense instance at a time. The lock file also
+    stores state about the pfSense instance that is passed from one holder of the lock to the next, e.g. the SAML2
+    configuration that was last set.
+
+    Attributes:
+        path (pathlib.Path): The path of the lock file, which must be shared by all workers
+        state (dict): The state stored in the lock file, available while the lock is held
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """
+        Initializes the TargetLock
+
+        Args:
+            path (pathlib.Path): The path of the lock file, which must be shared by all workers
+        """
+        self.path = path
+        self.state = {}
+        self.fd = None
+
+    def __enter__(self) -> dict:
+        """
+        Waits for the lock and reads the state stored in the lock file
+
+        Returns:
+            dict: The state stored in the lock file. Changes are written back when the lock is released.
+        """
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        data = os.read(self.fd, os.fstat(self.fd).st_size)
+        self.state = json.loads(data) if data else {}
+        return self.state
+
+    def __exit__(self, *exc_info) -> None:
+        """Writes the state back to the lock file and releases the lock"""
+        os.ftruncate(self.fd, 0)
+        os.pwrite(self.fd, json.dumps(self.state).encode(), 0)
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
@@ -0,0 +1,343 @@
+<?php
+//    Copyright 2025 Jared Hendrickson
+//
+//   Licensed under the Apache License, Version 2.0 (the "License");
+//   you may not use this file except in compliance with the License.
+//   You may obtain a copy of the License at
+//
+//       http://www.apache.org/licenses/LICENSE-2.0
+//
+//   Unless required by applicable law or agreed to in writing, software
+//   distributed under the License is distributed on an "AS IS" BASIS,
+//   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//   See the License for the specific language governing permissions and
+//   limitations under the License.
+
+# Replays signed SAML2 responses through Auth::acs() on a plain PHP install, without pfSense. The pfSense config.inc
+# and auth.inc are replaced by the in-memory stand-ins in the `include` directory. See tools/README.md for usage.
+
+use OneLogin\Saml2\Utils;
+use Saml2\Core\Auth;
+use Saml2\Core\Cache;
+use Saml2\Core\Config;
+use Saml2\Core\Stats;
+
+const USAGE = <<<EOT
+Usage: php tools/acs_harness/acs_harness.php [options]
+
+Options:
+  --responses=<n>   Number of SAML2 responses to replay. Defaults to 1000.
+  --warmup=<n>      Number of SAML2 responses to replay before measuring. Defaults to 20.
+  --groups=<list>   Comma separated groups to include in each response. Defaults to 'admins'.
+  --output=<path>   Write the results to a JSON file.
+  --help            Print this help message.
+
+EOT;
+const HARNESS_HOST = 'pfsense.acs-harness.test';
+const HARNESS_IDP_ENTITY_ID = 'https://idp.acs-harness.test/metadata';
+const HARNESS_GROUPS_ATTRIBUTE = 'groups';
+const HARNESS_PRIV_GROUP = 'admins';
+
+# Never run on pfSense, the stand-ins would shadow the real configuration functions and the cache files are shared
+if (is_file('/etc/inc/config.inc')) {
+    fwrite(STDERR, 'error: the ACS harness is meant for plain PHP installs, do not run it on pfSense.' . PHP_EOL);
+    exit(1);
+}
+
+# Load the stand-ins first so the Saml2 classes find them instead of the pfSense includes
+$repo_dir = dirname(__DIR__, 2);
+set_include_path(
+    __DIR__ . '/include' . PATH_SEPARATOR .
+        "$repo_dir/pfSense-pkg-saml2-auth/files/usr/local/pkg" . PATH_SEPARATOR .
+        get_include_path(),
+);
+require_once 'Saml2/autoload.php';
+
+/**
+ * Generates the private key and self-signed certificate the harness signs its SAML2 responses with.
+ * @return array The PEM encoded 'key' and 'cert'.
+ */
+function generate_idp_keypair(): array {
+    $key = openssl_pkey_new(['private_key_bits' => 2048, 'private_key_type' => OPENSSL_KEYTYPE_RSA]);
+    $csr = openssl_csr_new(['commonName' => 'acs-harness-idp'], $key, ['digest_alg' => 'sha256']);
+    $x509 = openssl_csr_sign($csr, null, $key, 1, ['digest_alg' => 'sha256']);
+    openssl_pkey_export($key, $key_pem);
+    openssl_x509_export($x509, $cert_pem);
+    return ['key' => $key_pem, 'cert' => $cert_pem];
+}
+
+/**
+ * Populates the in-memory pfSense configuration with a package configuration trusting the harness's IdP certificate,
+ * and with a local group that is allowed all pages.
+ * @param string $cert_pem The PEM encoded certificate of the harness's IdP.
+ */
+function seed_config(string $cert_pem): void {
+    config_set_path('system/group', [['name' => HARNESS_PRIV_GROUP, 'priv' => ['page-all']]]);
+    config_set_path('installedpackages/package', [
+        [
+            'name' => 'pfSense-pkg-saml2-auth',
+            'internal_name' => 'saml2-auth',
+            'conf' => [
+                'enable' => 'yes',
+                'strip_username' => '',
+                'debug_mode' => '',
+                'idp_metadata_url' => '',
+                'idp_entity_id' => HARNESS_IDP_ENTITY_ID,
+                'idp_sign_on_url' => 'https://idp.acs-harness.test/sso',
+                'idp_groups_attribute' => HARNESS_GROUPS_ATTRIBUTE,
+                'session_attributes' => '',
+                'idp_x509_cert' => base64_encode($cert_pem),
+                'sp_base_url' => 'https://' . HARNESS_HOST,
+                'acs_max_response_size' => '',
+                'rate_limit_per_source' => '',
+                'rate_limit_global' => '',
+                'custom_conf' => '',
+            ],
+        ],
+    ]);
+    write_config('Configured the ACS harness');
+}
+
+/**
+ * Generates a SAML2 response for a pending AuthNRequest, with an assertion signed by the harness's IdP.
+ * @param array $keypair The PEM encoded 'key' and 'cert' to sign the assertion with.
+ * @param string $request_id The ID of the AuthNRequest the response answers.
+ * @param string $name_id The NameID of the assertion.
+ * @param array $groups The values of the groups attribute of the assertion.
+ * @return string The Base64 encoded SAML2 response, as posted to the ACS.
+ */
+function generate_response(array $keypair, string $request_id, string $name_id, array $groups): string {
+    $sp_base_url = 'https://' . HARNESS_HOST;
+    $acs_url = $sp_base_url . Auth::SP_ACS_URL;
+    $now = time();
+    $issued = gmdate('Y-m-d\TH:i:s\Z', $now);
+    $not_before = gmdate('Y-m-d\TH:i:s\Z', $now - 60);
+    $not_on_or_after = gmdate('Y-m-d\TH:i:s\Z', $now + 300);
+    $e = fn(string $value): string => htmlspecialchars($value, ENT_QUOTES | ENT_XML1);
+    $values = implode('', array_map(fn($group) => "<saml:AttributeValue>{$e($group)}</saml:AttributeValue>", $groups));
+
+    $assertion =
+        '<saml:Assertion xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" ' .
+        "ID=\"_{$e(bin2hex(random_bytes(20)))}\" Version=\"2.0\" IssueInstant=\"$issued\">" .
+        '<saml:Issuer>' . $e(HARNESS_IDP_ENTITY_ID) . '</saml:Issuer>' .
+        '<saml:Subject>' .
+        "<saml:NameID Format=\"urn:oasis:names:tc:SAML:1.1:nameid-format:unspecified\">{$e($name_id)}</saml:NameID>" .
+        '<saml:SubjectConfirmation Method="urn:oasis:names:tc:SAML:2.0:cm:bearer">' .
+        "<saml:SubjectConfirmationData NotOnOrAfter=\"$not_on_or_after\" Recipient=\"{$e($acs_url)}\" " .
+        "InResponseTo=\"{$e($request_id)}\"/>" .
+        '</saml:SubjectConfirmation>' .
+        '</saml:Subject>' .
+        "<saml:Conditions NotBefore=\"$not_before\" NotOnOrAfter=\"$not_on_or_after\">" .
+        '<saml:AudienceRestriction>' .
+        "<saml:Audience>{$e($sp_base_url . Auth::SP_METADATA_URL)}</saml:Audience>" .
+        '</saml:AudienceRestriction>' .
+        '</saml:Conditions>' .
+        "<saml:AuthnStatement AuthnInstant=\"$issued\" SessionIndex=\"_{$e(bin2hex(random_bytes(16)))}\">" .
+        '<saml:AuthnContext><saml:AuthnContextClassRef>' .
+        'urn:oasis:names:tc:SAML:2.0:ac:classes:PasswordProtectedTransport' .
+        '</saml:AuthnContextClassRef></saml:AuthnContext>' .
+        '</saml:AuthnStatement>' .
+        '<saml:AttributeStatement>' .
+        "<saml:Attribute Name=\"{$e(HARNESS_GROUPS_ATTRIBUTE)}\">$values</saml:Attribute>" .
+        '</saml:AttributeStatement>' .
+        '</saml:Assertion>';
+
+    # Sign the assertion and drop the XML declaration added by php-saml so it can be embedded in the response
+    $signed_assertion = Utils::addSign($assertion, $keypair['key'], $keypair['cert']);
+    $signed_assertion = preg_replace('/^<\?xml[^>]*\?>\s*/', '', $signed_assertion);
+
+    return base64_encode(
+        '<samlp:Response xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol" ' .
+            'xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" ' .
+            "ID=\"_{$e(bin2hex(random_bytes(20)))}\" Version=\"2.0\" IssueInstant=\"$issued\" " .
+            "Destination=\"{$e($acs_url)}\" InResponseTo=\"{$e($request_id)}\">" .
+            '<saml:Issuer>' . $e(HARNESS_IDP_ENTITY_ID) . '</saml:Issuer>' .
+            '<samlp:Status><samlp:StatusCode Value="urn:oasis:names:tc:SAML:2.0:status:Success"/></samlp:Status>' .
+            $signed_assertion .
+            '</samlp:Response>',
+    );
+}
+
+/**
+ * Generates a corpus of unique SAML2 responses, each answering its own AuthNRequest.
+ * @param array $keypair The PEM encoded 'key' and 'cert' to sign the assertions with.
+ * @param int $count The number of responses to generate.
+ * @param array $groups The values of the groups attribute of each assertion.
+ * @return array The 'request_id', 'name_id' and Base64 encoded 'response' of each response.
+ */
+function generate_corpus(array $keypair, int $count, array $groups): array {
+    $corpus = [];
+    for ($i = 0; $i < $count; $i++) {
+        $request_id = 'ONELOGIN_' . bin2hex(random_bytes(20));
+        $name_id = "harness-user-$i";
+        $corpus[] = [
+            'request_id' => $request_id,
+            'name_id' => $name_id,
+            'response' => generate_response($keypair, $request_id, $name_id, $groups),
+        ];
+    }
+    return $corpus;
+}
+
+/**
+ * Posts a SAML2 response to Auth::acs() in a fresh session, the same way the ACS endpoint does. The SSO login is
+ * marked as started in the session first, as Auth::sso() would have done before redirecting to the IdP.
+ * @param array $entry The 'request_id', 'name_id' and Base64 encoded 'response' to post.
+ * @return bool Returns true if the response established an SSO session, false otherwise.
+ */
+function replay_response(array $entry): bool {
+    # Each response is handled as its own request, so the configuration is loaded again for every response
+    Config::reset();
+    $_POST = ['SAMLResponse' => $entry['response']];
+    session_id(bin2hex(random_bytes(16)));
+
+    $GLOBALS['harness_replaying'] = true;
+    $auth = new Auth();
+    $_SESSION['saml2_started'] = true;
+    $_SESSION['AuthNRequestID'] = $entry['request_id'];
+    $_SESSION['Logged_In'] = false;
+    $GLOBALS['harness_auth'] = $auth;
+    $auth->acs();
+    $GLOBALS['harness_auth'] = null;
+    $GLOBALS['harness_replaying'] = false;
+
+    $authenticated = ($_SESSION['saml2_auth'] ?? false) === true;
+    if (session_status() === PHP_SESSION_ACTIVE) {
+        session_destroy();
+    }
+    $_SESSION = [];
+    Stats::flush();
+    return $authenticated;
+}
+
+/**
+ * Replays each SAML2 response of a corpus and measures the throughput and memory use of Auth::acs().
+ * @param array $corpus The responses to replay, as returned by generate_corpus().
+ * @return array The 'responses', 'errors', 'seconds', 'responses_per_second', 'peak_bytes_per_response' and
+ * 'retained_bytes_per_response' of the replay.
+ */
+function replay_corpus(array $corpus): array {
+    $errors = 0;
+    $peak_bytes = 0;
+    $start_bytes = memory_get_usage();
+    $start = hrtime(true);
+    foreach ($corpus as $entry) {
+        # The peak can only be measured per response on PHP 8.2 and newer, use the peak of the whole run otherwise
+        $before_bytes = memory_get_usage();
+        if (function_exists('memory_reset_peak_usage')) {
+            memory_reset_peak_usage();
+        }
+        $errors += replay_response($entry) ? 0 : 1;
+        $peak_bytes += memory_get_peak_usage() - $before_bytes;
+    }
+    $seconds = (hrtime(true) - $start) / 1e9;
+    $count = count($corpus);
+
+    return [
+        'responses' => $count,
+        'errors' => $errors,
+        'seconds' => round($seconds, 3),
+        'responses_per_second' => round($count / $seconds, 1),
+        'peak_bytes_per_response' => intdiv($peak_bytes, $count),
+        'retained_bytes_per_response' => intdiv(memory_get_usage() - $start_bytes, $count),
+    ];
+}
+
+/**
+ * Reports a response that made Auth exit. Auth exits after redirecting to the SSO error page when it rejects a
+ * response or cannot load its settings, which would otherwise end the harness without any output.
+ */
+function report_rejection(): void {
+    if (!($GLOBALS['harness_replaying'] ?? false)) {
+        return;
+    }
+
+    $auth = $GLOBALS['harness_auth'] ?? null;
+    $reason = isset($auth->auth) ? $auth->auth->getLastErrorReason() : null;
+    fwrite(STDERR, 'error: Auth::acs() rejected a response: ' . ($reason ?: 'see the saml2 syslog entries') . PHP_EOL);
+    exit(1);
+}
+
+/**
+ * Prints the results of the replay and the phase statistics recorded by Auth::acs().
+ * @param array $results The results returned by replay_corpus().
+ * @param array $phases The phase statistics returned by Stats::read().
+ */
+function print_results(array $results, array $phases): void {
+    echo "Responses:              {$results['responses']} ({$results['errors']} errors)" . PHP_EOL;
+    echo "Duration:               {$results['seconds']} s" . PHP_EOL;
+    echo "Throughput:             {$results['responses_per_second']} responses/s" . PHP_EOL;
+    echo 'Peak memory/response:   ' . round($results['peak_bytes_per_response'] / 1024, 1) . ' KiB' . PHP_EOL;
+    echo 'Retained memory/resp.:  ' . round($results['retained_bytes_per_response'] / 1024, 1) . ' KiB' . PHP_EOL;
+    echo PHP_EOL;
+    printf('%-32s %8s %8s %10s %10s %10s %10s' . PHP_EOL, 'PHASE', 'COUNT', 'ERRORS', 'P50', 'P95', 'P99', 'MAX');
+    foreach ($phases as $phase => $stats) {
+        printf(
+            '%-32s %8d %8d %8sms %8sms %8sms %8sms' . PHP_EOL,
+            $phase,
+            $stats['count'],
+            $stats['errors'],
+            $stats['p50_ms'],
+            $stats['p95_ms'],
+            $stats['p99_ms'],
+            $stats['max_ms'],
+        );
+    }
+}
+
+$options = getopt('', ['responses:', 'warmup:', 'groups:', 'output:', 'help']);
+if (isset($options['help'])) {
+    echo USAGE;
+    exit(0);
+}
+$responses = (int) ($options['responses'] ?? 1000);
+$warmup = (int) ($options['warmup'] ?? 20);
+$groups = array_map('trim', explode(',', $options['groups'] ?? HARNESS_PRIV_GROUP));
+$groups = array_values(array_filter($groups, 'strlen'));
+if ($responses < 1 or $warmup < 0) {
+    fwrite(STDERR, USAGE);
+    exit(1);
+}
+
+# The Saml2 classes keep their caches in the package's cache directory, which must be writable
+if ((!is_dir(Cache::CACHE_DIR) and !@mkdir(Cache::CACHE_DIR, 0755, true)) or !is_writable(Cache::CACHE_DIR)) {
+    fwrite(STDERR, 'error: ' . Cache::CACHE_DIR . ' is not writable, run the harness as root.' . PHP_EOL);
+    exit(1);
+}
+
+# Sessions are kept in a temporary directory, output is written directly to STDOUT/STDERR so no headers are sent
+$session_dir = sys_get_temp_dir() . '/acs_harness_sessions';
+is_dir($session_dir) or mkdir($session_dir, 0700);
+ini_set('session.save_path', $session_dir);
+ini_set('session.use_cookies', '0');
+ini_set('session.cache_limiter', '');
+$_SERVER['HTTP_HOST'] = HARNESS_HOST;
+$_SERVER['HTTPS'] = 'on';
+$_SERVER['SERVER_PORT'] = '443';
+$_SERVER['REQUEST_URI'] = Auth::SP_ACS_URL;
+$_SERVER['REQUEST_METHOD'] = 'POST';
+$_SERVER['REMOTE_ADDR'] = '127.0.0.1';
+register_shutdown_function('report_rejection');
+
+# Sign a fresh corpus with a fresh IdP key pair, responses are bound to their AuthNRequest and expire quickly
+fwrite(STDERR, 'Generating ' . ($warmup + $responses) . ' signed SAML2 responses...' . PHP_EOL);
+$keypair = generate_idp_keypair();
+seed_config($keypair['cert']);
+$corpus = generate_corpus($keypair, $warmup + $responses, $groups);
+
+# Warm up the caches (settings snapshot, IdP certificates, autoloaded classes) before measuring
+fwrite(STDERR, "Replaying $warmup warm-up and $responses measured SAML2 responses..." . PHP_EOL);
+if ($warmup) {
+    replay_corpus(array_slice($corpus, 0, $warmup));
+}
+Stats::reset();
+$results = replay_corpus(array_slice($corpus, $warmup));
+$phases = Stats::read();
+$results['php_version'] = PHP_VERSION;
+$results['opcache'] = function_exists('opcache_get_status') && (bool) opcache_get_status(false);
+
+print_results($results, $phases);
+if (isset($options['output'])) {
+    file_put_contents($options['output'], json_encode($results + ['phases' => $phases], JSON_PRETTY_PRINT) . PHP_EOL);
+}
+exit($results['errors'] ? 1 : 0);
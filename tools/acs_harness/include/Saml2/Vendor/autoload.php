@@ -0,0 +1,24 @@
+<?php
+//    Copyright 2025 Jared Hendrickson
+//
+//   Licensed under the Apache License, Version 2.0 (the "License");
+//   you may not use this file except in compliance with the License.
+//   You may obtain a copy of the License at
+//
+//       http://www.apache.org/licenses/LICENSE-2.0
+//
+//   Unless required by applicable law or agreed to in writing, software
+//   distributed under the License is distributed on an "AS IS" BASIS,
+//   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//   See the License for the specific language governing permissions and
+//   limitations under the License.
+
+# Stands in for the package's Saml2/Vendor/autoload.php, which only exists in built packages. Loads the dependencies
+# installed by running `composer install` in the root of the repository instead.
+
+$autoload_path = dirname(__DIR__, 5) . '/vendor/autoload.php';
+if (!is_file($autoload_path)) {
+    fwrite(STDERR, "error: $autoload_path not found, run 'composer install' in the root of the repository." . PHP_EOL);
+    exit(1);
+}
+require_once $autoload_path;